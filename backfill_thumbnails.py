@@ -0,0 +1,34 @@
+from .database.database import SessionLocal
+from .models.models import Material, PengenalanReaksi
+from .schemas import utils
+
+
+def backfill():
+    with SessionLocal() as db:
+        materials = (
+            db.query(Material)
+            .filter(Material.media_type == "video", Material.thumbnail.is_(None))
+            .all()
+        )
+        for material in materials:
+            try:
+                material.thumbnail = utils.backfill_video_thumbnail(material.filename, isTeacher=True)
+                db.commit()
+                print(f"Materi {material.material_id}: {material.thumbnail}")
+            except Exception as e:
+                db.rollback()
+                print(f"Materi {material.material_id} gagal: {e}")
+
+        introductions = db.query(PengenalanReaksi).filter(PengenalanReaksi.thumbnail.is_(None)).all()
+        for introduction in introductions:
+            try:
+                introduction.thumbnail = utils.backfill_video_thumbnail(introduction.filename)
+                db.commit()
+                print(f"Pengenalan {introduction.intro_id}: {introduction.thumbnail}")
+            except Exception as e:
+                db.rollback()
+                print(f"Pengenalan {introduction.intro_id} gagal: {e}")
+
+
+if __name__ == "__main__":
+    backfill()
@@ -0,0 +1,253 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Generator, List, Optional, Tuple
+import hashlib
+import tempfile
+import threading
+import time
+import os
+import dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single dev server, the thread lock is enough
+    fcntl = None
+
+dotenv.load_dotenv()
+
+CACHE_DIR = os.getenv("FTP_CACHE_DIR", os.path.join(tempfile.gettempdir(), "virtual-lab-cache"))
+CACHE_MAX_BYTES = int(os.getenv("FTP_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+LOCK_FILE = ".lock"
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+# How stale a user's token version may be, i.e. how long a revoked token can
+# still get through on a worker that did not revoke it
+TOKEN_VERSION_TTL = float(os.getenv("TOKEN_VERSION_TTL", "5"))
+
+
+class DiskCache:
+    # The directory is shared by every worker process, so it is the index:
+    # a hit is a file that exists, recency is its mtime, and eviction scans
+    # the directory under a file lock so workers never exceed one budget.
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+            with self._locked():
+                self._evict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @contextmanager
+    def _locked(self) -> Generator[None, None, None]:
+        with self._lock, open(os.path.join(self.directory, LOCK_FILE), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _key(self, account: str, filename: str) -> str:
+        return hashlib.sha1(f"{account}/{filename}".encode()).hexdigest()
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith("tmp") or entry.name == LOCK_FILE:
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            found.append((stat.st_mtime, entry.name, stat.st_size))
+        return found
+
+    def get(self, account: str, filename: str, record: bool = True) -> Optional[str]:
+        if not self.enabled:
+            return None
+        path = os.path.join(self.directory, self._key(account, filename))
+        try:
+            if record:
+                os.utime(path)
+            elif not os.path.isfile(path):
+                raise FileNotFoundError(path)
+        except FileNotFoundError:
+            if record:
+                self.misses += 1
+            return None
+        if record:
+            self.hits += 1
+        return path
+
+    def temp_file(self):
+        return tempfile.NamedTemporaryFile(dir=self.directory, prefix="tmp", delete=False)
+
+    def put_file(self, account: str, filename: str, temp_path: str):
+        file_size = os.path.getsize(temp_path)
+        if not self.enabled or file_size > self.max_bytes:
+            os.remove(temp_path)
+            return
+        with self._locked():
+            os.replace(temp_path, os.path.join(self.directory, self._key(account, filename)))
+            self._evict()
+
+    def put(self, account: str, filename: str, content: bytes):
+        if not self.enabled or len(content) > self.max_bytes:
+            return
+        with self.temp_file() as file:
+            file.write(content)
+        self.put_file(account, filename, file.name)
+
+    def invalidate(self, account: str, filename: str):
+        if not self.enabled:
+            return
+        self._remove(self._key(account, filename))
+
+    def _evict(self):
+        # Least recently used first, across every worker's entries
+        found = sorted(self._scan())
+        total = sum(file_size for _, _, file_size in found)
+        for _, key, file_size in found:
+            if total <= self.max_bytes:
+                break
+            total -= file_size
+            self.evictions += 1
+            self._remove(key)
+
+    def _remove(self, key: str):
+        # Readers that already opened the file keep their handle on POSIX
+        try:
+            os.remove(os.path.join(self.directory, key))
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        found = self._scan() if self.enabled else []
+        return {
+            "enabled": self.enabled,
+            "entries": len(found),
+            "bytes": sum(file_size for _, _, file_size in found),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class UserCache:
+    # Column values of authenticated users, keyed by username and token id.
+    # Per process: another worker may serve a changed row for up to ttl.
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, username: str, token_id: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        key = (username, token_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, username: str, token_id: str, values: dict):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[(username, token_id)] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end((username, token_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, username: str):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == username]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "ttl": self.ttl,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class TokenVersionCache:
+    # Current token version per user_id. The database is the source shared by
+    # all workers; each process reads a user's version again once its entry
+    # is older than ttl.
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, user_id: int, load: Callable[[], Optional[int]]) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.loads += 1
+        version = load()
+        if version is not None:
+            self.put(user_id, version)
+        return version
+
+    def put(self, user_id: int, version: int):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, version)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "loads": self.loads,
+        }
+
+
+content_cache = DiskCache(CACHE_DIR, CACHE_MAX_BYTES)
+user_cache = UserCache(USER_CACHE_TTL, USER_CACHE_MAX_ENTRIES)
+token_versions = TokenVersionCache(TOKEN_VERSION_TTL, USER_CACHE_MAX_ENTRIES)
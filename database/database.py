@@ -1,23 +1,227 @@
-from sqlalchemy import MetaData, create_engine
+from sqlalchemy import MetaData, create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+import threading
+import math
+import time
 import os
 import dotenv
 
 dotenv.load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
+SQLALCHEMY_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+# Every worker process opens its own pools, on the primary and again on the
+# replica, so a worker can hold up to DB_POOL_SIZE + DB_MAX_OVERFLOW +
+# DB_ASYNC_POOL_SIZE + DB_ASYNC_MAX_OVERFLOW connections per server (25 by
+# default); keep workers * that under MySQL's max_connections (151).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+# Only the ported hot reads use the async engine
+DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", "5"))
+DB_ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+# A client's reads stay on the primary this long after it commits a write,
+# which has to cover the replica's replication lag. The client carries the
+# pin in a cookie, so it holds whichever worker serves the next request.
+REPLICA_READ_YOUR_WRITES_SECONDS = float(os.getenv("REPLICA_READ_YOUR_WRITES_SECONDS", "10"))
+READ_PRIMARY_COOKIE = "read_primary"
+# How long an unreachable replica is skipped before it is tried again
+REPLICA_RETRY_AFTER = float(os.getenv("REPLICA_RETRY_AFTER", "30"))
+
+
+class _PoolStatsMixin:
+    # Times every checkout, including the wait for a free connection when
+    # the pool and its overflow are exhausted.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "timeout": self.timeout(),
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_time_total": round(self.wait_time_total, 4),
+            "wait_time_max": round(self.wait_time_max, 4),
+            "wait_time_avg": round(self.wait_time_total / self.checkouts, 6) if self.checkouts else 0.0,
+        }
+
+
+class StatsQueuePool(_PoolStatsMixin, QueuePool):
+    pass
+
+
+class StatsAsyncQueuePool(_PoolStatsMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+pool_options = dict(
+    pool_pre_ping=True,  # Checks the connection before using it
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+)
+async_pool_options = dict(
+    pool_options,
+    pool_size=DB_ASYNC_POOL_SIZE,
+    max_overflow=DB_ASYNC_MAX_OVERFLOW,
+)
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,  # Checks the connection before using it
-    pool_recycle=3600 # Recycle connections after 1 hour 
+    poolclass=StatsQueuePool,
+    **pool_options
     )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-meta = MetaData()
+# Same database through an asyncio driver, for handlers that should not
+# block the event loop while waiting on a query.
+ASYNC_DRIVERS = {"mysql": "aiomysql", "sqlite": "aiosqlite"}
+
+
+def get_async_database_url(url: str) -> str:
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        return url.render_as_string(hide_password=False)
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or get_async_database_url(SQLALCHEMY_DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=StatsAsyncQueuePool,
+    **async_pool_options
+    )
 
-conn = engine.connect()
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+# Optional read replica; without DATABASE_REPLICA_URL every read goes to
+# the primary.
+replica_engine = None
+ReplicaSessionLocal = None
+async_replica_engine = None
+AsyncReplicaSessionLocal = None
+if SQLALCHEMY_REPLICA_URL:
+    replica_engine = create_engine(
+        SQLALCHEMY_REPLICA_URL,
+        poolclass=StatsQueuePool,
+        **pool_options
+        )
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+    async_replica_engine = create_async_engine(
+        os.getenv("ASYNC_DATABASE_REPLICA_URL") or get_async_database_url(SQLALCHEMY_REPLICA_URL),
+        poolclass=StatsAsyncQueuePool,
+        **async_pool_options
+        )
+    AsyncReplicaSessionLocal = async_sessionmaker(
+        async_replica_engine, autoflush=False, expire_on_commit=False
+    )
+
+
+class ReplicaRouter:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.pinned_reads = 0
+        self.failovers = 0
+
+    def use_replica(self, pinned: bool = False) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            use = self.enabled and now >= self._down_until and not pinned
+            if use:
+                self.replica_reads += 1
+            else:
+                self.primary_reads += 1
+                if self.enabled and pinned:
+                    self.pinned_reads += 1
+            return use
+
+    def mark_down(self):
+        with self._lock:
+            self._down_until = time.monotonic() + REPLICA_RETRY_AFTER
+            self.failovers += 1
+            self.replica_reads -= 1
+            self.primary_reads += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "healthy": time.monotonic() >= self._down_until,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "pinned_reads": self.pinned_reads,
+            "failovers": self.failovers,
+        }
+
+
+replica_router = ReplicaRouter(replica_engine is not None)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _pin_writer_to_primary(session):
+    # get_db hands the request's response to its session
+    response = session.info.get("response")
+    if response is None or not replica_router.enabled or session.info.get("pinned"):
+        return
+    response.set_cookie(
+        READ_PRIMARY_COOKIE,
+        "1",
+        max_age=math.ceil(REPLICA_READ_YOUR_WRITES_SECONDS),
+        httponly=True,
+        samesite="lax",
+    )
+    session.info["pinned"] = True
+
+
+def db_pool_stats() -> dict:
+    stats = {
+        "sync": engine.pool.stats(),
+        "async": async_engine.pool.stats(),
+        "replica": replica_router.stats(),
+    }
+    if replica_engine is not None:
+        stats["replica_sync"] = replica_engine.pool.stats()
+        stats["replica_async"] = async_replica_engine.pool.stats()
+    return stats
+
+
+meta = MetaData()
 
 Base = declarative_base()
@@ -1,14 +1,26 @@
-from fastapi import Depends, HTTPException
+from fastapi import Cookie, Depends, HTTPException, Response
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt, ExpiredSignatureError
 from typing import Annotated, Generator, AsyncGenerator
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import DBAPIError
 from datetime import datetime, timedelta
 from typing import Optional
-from ftplib import FTP
 import os, dotenv
+import uuid
 
-from ..database.database import SessionLocal
+from ..database.database import (
+    SessionLocal,
+    AsyncSessionLocal,
+    ReplicaSessionLocal,
+    AsyncReplicaSessionLocal,
+    replica_router,
+    READ_PRIMARY_COOKIE,
+)
+from ..ftp import connection as ftp_pool_connection
+from ..cache import user_cache, token_versions
 from ..models import models
 from ..schemas import schemas
 
@@ -18,27 +30,71 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = os.getenv("JWT_ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_EXPIRE_MINUTES"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("JWT_REFRESH_EXPIRE_DAYS"))
+# Opt-in: access tokens also carry user_id, user_type and the user's token
+# version, so current_principal can authorize without touching the DB.
+JWT_EMBED_CLAIMS = os.getenv("JWT_EMBED_CLAIMS", "false").lower() == "true"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def get_db():
+def get_db(response: Response):
     db = SessionLocal()
+    # Commits set the cookie that keeps this client's reads on the primary
+    db.info["response"] = response
     try:
         yield db
     finally:
         db.close()
 
 
-async def get_async_db() -> AsyncGenerator:
-    async with SessionLocal() as session:
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as session:
         yield session
 
-def get_ftp_connection() -> Generator:
-    ftp = FTP(os.getenv("FTP_HOST"))
-    ftp.login(user=os.getenv("FTP_USER"), passwd=os.getenv("FTP_PASS"))
+def get_read_db(
+    primary: Session = Depends(get_db),
+    read_primary: Optional[str] = Cookie(default=None, alias=READ_PRIMARY_COOKIE),
+):
+    # Without the replica this is the request's primary session, the same
+    # one get_current_user uses, so the request holds a single connection
+    db = None
+    if replica_router.use_replica(pinned=read_primary is not None):
+        db = ReplicaSessionLocal()
+        try:
+            db.connection()
+        except DBAPIError:
+            db.close()
+            db = None
+            replica_router.mark_down()
+    if db is None:
+        yield primary
+        return
     try:
-        yield ftp
+        yield db
     finally:
-        ftp.quit()
+        db.close()
+
+
+async def get_async_read_db(
+    primary: AsyncSession = Depends(get_async_db),
+    read_primary: Optional[str] = Cookie(default=None, alias=READ_PRIMARY_COOKIE),
+) -> AsyncGenerator[AsyncSession, None]:
+    session = None
+    if replica_router.use_replica(pinned=read_primary is not None):
+        session = AsyncReplicaSessionLocal()
+        try:
+            await session.connection()
+        except DBAPIError:
+            await session.close()
+            session = None
+            replica_router.mark_down()
+    if session is None:
+        yield primary
+        return
+    async with session:
+        yield session
+
+def get_ftp_connection() -> Generator:
+    with ftp_pool_connection() as ftp:
+        yield ftp
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -46,10 +102,18 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def user_token_claims(user: models.User) -> dict:
+    claims = {"sub": user.username}
+    if JWT_EMBED_CLAIMS:
+        claims.update(
+            {"user_id": user.user_id, "user_type": user.user_type, "ver": user.token_version}
+        )
+    return claims
+
 def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -66,13 +130,60 @@ def verify_token(token: str, credentials_exception):
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = schemas.TokenData(username=username)
+        # Tokens issued before jti was added are told apart by their expiry
+        token_id = payload.get("jti") or str(payload.get("exp"))
+        token_data = schemas.TokenData(
+            username=username,
+            token_id=token_id,
+            user_id=payload.get("user_id"),
+            user_type=payload.get("user_type"),
+            token_version=payload.get("ver"),
+        )
     except ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token telah expired!")
     except JWTError:
         raise credentials_exception
     return token_data
 
+# Bumping the version on the user row revokes older tokens: right away in
+# the process that bumped it, on other workers within TOKEN_VERSION_TTL.
+def note_token_version(user_id: int, version: int):
+    token_versions.put(user_id, version)
+
+def current_token_version(user_id: int, db: Session) -> Optional[int]:
+    return token_versions.get(
+        user_id,
+        lambda: db.scalar(select(models.User.token_version).where(models.User.user_id == user_id)),
+    )
+
+def _revoked_exception() -> HTTPException:
+    return HTTPException(status_code=401, detail="Token sudah tidak berlaku!")
+
+def _resolve_user(token_data: schemas.TokenData, db: Session, credentials_exception):
+    values = user_cache.get(token_data.username, token_data.token_id)
+    if values is not None and values["token_version"] != current_token_version(values["user_id"], db):
+        # The password or email changed since this entry was cached
+        user_cache.invalidate(token_data.username)
+        values = None
+    if values is not None:
+        # A detached snapshot, kept out of this request's session so queries
+        # there still load Users rows fresh from the database
+        user = models.User(**values)
+        make_transient_to_detached(user)
+    else:
+        user = db.query(models.User).filter(models.User.username == token_data.username).first()
+        if user is None:
+            raise credentials_exception
+        user_cache.put(
+            token_data.username,
+            token_data.token_id,
+            {attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs},
+        )
+        note_token_version(user.user_id, user.token_version)
+    if token_data.token_version is not None and token_data.token_version < user.token_version:
+        raise _revoked_exception()
+    return user
+
 def get_current_user(token: str = Depends(oauth2_scheme)
                      , db: Session = Depends(get_db)
                      ):
@@ -80,10 +191,31 @@ def get_current_user(token: str = Depends(oauth2_scheme)
         status_code=401, detail="Tidak dapat mengenali akun!"
     )
     token_data = verify_token(token, credentials_exception)   
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
-    if user is None:
+    return _resolve_user(token_data, db, credentials_exception)
+
+def get_current_principal(token: str = Depends(oauth2_scheme)
+                          , db: Session = Depends(get_db)
+                          ) -> schemas.Principal:
+    # The session only connects if it is used: for tokens without embedded
+    # claims, or to refresh the user's token version once it is stale.
+    credentials_exception = HTTPException(
+        status_code=401, detail="Tidak dapat mengenali akun!"
+    )
+    token_data = verify_token(token, credentials_exception)
+    if token_data.user_id is None or token_data.user_type is None or token_data.token_version is None:
+        user = _resolve_user(token_data, db, credentials_exception)
+        return schemas.Principal(user_id=user.user_id, username=user.username, user_type=user.user_type)
+
+    current_version = current_token_version(token_data.user_id, db)
+    if current_version is None:
         raise credentials_exception
-    return user
+    if token_data.token_version < current_version:
+        raise _revoked_exception()
+    return schemas.Principal(
+        user_id=token_data.user_id,
+        username=token_data.username,
+        user_type=token_data.user_type,
+    )
 
 def get_token_data_for_video(token: str = Depends(oauth2_scheme)
                      , db: Session = Depends(get_db)
@@ -95,7 +227,10 @@ def get_token_data_for_video(token: str = Depends(oauth2_scheme)
     return token_data
 
 current_user_dependency = Depends(get_current_user)
+current_principal_dependency = Depends(get_current_principal)
 introduction_dependency = Depends(get_token_data_for_video)
 db_dependency = Annotated[Session, Depends(get_db)]
 ftp_connection = Depends(get_ftp_connection)
-async_db_dependency = Annotated[AsyncGenerator, Depends(get_async_db)]
\ No newline at end of file
+async_db_dependency = Annotated[AsyncSession, Depends(get_async_db)]
+db_read_dependency = Annotated[Session, Depends(get_read_db)]
+async_db_read_dependency = Annotated[AsyncSession, Depends(get_async_read_db)]
\ No newline at end of file
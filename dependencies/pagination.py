@@ -0,0 +1,122 @@
+from fastapi import Depends, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Annotated, List, Optional, Tuple
+from datetime import datetime
+import os
+import dotenv
+
+from ..schemas import utils
+
+dotenv.load_dotenv()
+
+# Rows per page when the client does not pass `limit`
+DEFAULT_PAGE_LIMIT = int(os.getenv("DEFAULT_PAGE_LIMIT", "20"))
+
+
+class Pagination:
+    def __init__(
+        self,
+        response: Response,
+        limit: Optional[int] = Query(default=None, ge=1, le=100),
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None,
+    ):
+        self.response = response
+        self.requested_limit = limit
+        self.limit = limit if limit is not None else DEFAULT_PAGE_LIMIT
+        self.cursor = cursor
+        self.fields = fields
+        self.next_cursor = None
+
+    def default_limit(self, limit: int):
+        # For lists that show a different number of rows by default
+        if self.requested_limit is None:
+            self.limit = limit
+
+    def select_fields(self, available: List[str]) -> List[str]:
+        if self.fields is None:
+            return list(available)
+        requested = list(dict.fromkeys(name.strip() for name in self.fields.split(",") if name.strip()))
+        if not requested or any(name not in available for name in requested):
+            raise HTTPException(status_code=400, detail="Field tidak valid!")
+        return requested
+
+    def load_only(self, model, order_column, id_column):
+        # Entity queries: only the requested columns are loaded (the primary
+        # key and the cursor columns always are), so `fields=` trims both the
+        # SELECT and the serialized objects.
+        available = [column.key for column in inspect(model).column_attrs]
+        fields = self.select_fields(available)
+        return load_only(*{name: getattr(model, name) for name in fields + [order_column.key, id_column.key]}.values())
+
+    def columns(self, available: dict, order_column, id_column) -> Tuple[List[str], list]:
+        # Projection queries: pick the requested labelled columns and add the
+        # cursor columns if the client did not ask for them.
+        fields = self.select_fields(list(available))
+        selected = {name: available[name] for name in fields}
+        selected.setdefault(order_column.key, order_column)
+        selected.setdefault(id_column.key, id_column)
+        return fields, [column.label(name) for name, column in selected.items()]
+
+    def keyset_statement(self, query, columns: list, parsers: list):
+        # Orders by `columns` (newest first) and continues after the cursor,
+        # whose values are read back with `parsers`, one per column
+        query = query.order_by(*[column.desc() for column in columns])
+        if self.cursor is not None:
+            try:
+                values = utils.decode_cursor(self.cursor)
+                if len(values) != len(parsers):
+                    raise ValueError(values)
+                values = [parse(value) for parse, value in zip(parsers, values)]
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="Cursor tidak valid!")
+            query = query.filter(utils.keyset_before(columns, values))
+        return query.limit(self.limit)
+
+    def keyset_page(self, rows: list, columns: list) -> list:
+        if len(rows) == self.limit:
+            last = rows[-1]
+            self.next_cursor = utils.encode_cursor(*[getattr(last, column.key) for column in columns])
+            self.response.headers["X-Next-Cursor"] = self.next_cursor
+        return rows
+
+    def statement(self, query, order_column, id_column):
+        # Works on both a Session Query and a select() statement
+        return self.keyset_statement(query, [order_column, id_column], [datetime.fromisoformat, int])
+
+    def page(self, rows: list, order_column, id_column) -> list:
+        return self.keyset_page(rows, [order_column, id_column])
+
+    def paginate(self, query, order_column, id_column) -> list:
+        rows = self.statement(query, order_column, id_column).all()
+        return self.page(rows, order_column, id_column)
+
+    async def paginate_async(self, db: AsyncSession, statement, order_column, id_column) -> list:
+        result = await db.execute(self.statement(statement, order_column, id_column))
+        return self.page(result.all(), order_column, id_column)
+
+    def paginate_posts(self, db: Session, posts) -> list:
+        # `posts` is a union of several post tables (see utils.pending_posts),
+        # so the type breaks ties between rows of different tables
+        columns = [posts.c.updated_at, posts.c.post_type, posts.c.post_id]
+        query = self.keyset_statement(select(posts), columns, [datetime.fromisoformat, str, int])
+        return self.keyset_page(db.execute(query).all(), columns)
+
+    @staticmethod
+    def project(rows: list, fields: List[str]) -> List[dict]:
+        return [{name: getattr(row, name) for name in fields} for row in rows]
+
+    def json_response(self, rows: list, fields: List[str]) -> JSONResponse:
+        # For projections whose columns are plain JSON values: serialize the
+        # rows directly instead of walking them with jsonable_encoder.
+        headers = {"X-Next-Cursor": self.next_cursor} if self.next_cursor else None
+        return JSONResponse(
+            [{name: row._mapping[name] for name in fields} for row in rows],
+            headers=headers,
+        )
+
+
+pagination_dependency = Annotated[Pagination, Depends()]
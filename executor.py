@@ -0,0 +1,129 @@
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from fastapi import HTTPException
+from functools import partial
+import asyncio
+import threading
+import os
+import dotenv
+
+dotenv.load_dotenv()
+
+IO_POOL_WORKERS = int(os.getenv("IO_POOL_WORKERS", "16"))
+IO_POOL_QUEUE = int(os.getenv("IO_POOL_QUEUE", "64"))
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(os.cpu_count() or 2)))
+CPU_POOL_QUEUE = int(os.getenv("CPU_POOL_QUEUE", "8"))
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", "2"))
+TRANSCODE_QUEUE = int(os.getenv("TRANSCODE_QUEUE", "16"))
+AUTH_POOL_WORKERS = int(os.getenv("AUTH_POOL_WORKERS", "2"))
+AUTH_POOL_QUEUE = int(os.getenv("AUTH_POOL_QUEUE", "64"))
+
+
+class BoundedExecutor:
+    def __init__(self, name: str, factory, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._factory = factory
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def executor(self) -> Executor:
+        # Created on first use so importing the app never forks or spawns threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._factory(max_workers=self.max_workers)
+            return self._executor
+
+    def _admit(self):
+        with self._lock:
+            if self.in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503, detail="Server sedang sibuk, coba lagi nanti!"
+                )
+            self.in_flight += 1
+
+    def _finished(self, _future=None):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def submit(self, func, *args, **kwargs) -> asyncio.Future:
+        # Admission happens synchronously, so callers can reject work before
+        # they reply to the client.
+        self._admit()
+        try:
+            future = self.executor.submit(func, *args, **kwargs)
+        except BaseException:
+            self._finished()
+            raise
+        future.add_done_callback(self._finished)
+        return asyncio.wrap_future(future)
+
+    async def run(self, func, *args, **kwargs):
+        return await self.submit(func, *args, **kwargs)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": min(self.in_flight, self.max_workers),
+            "queued": max(self.in_flight - self.max_workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+io_pool = BoundedExecutor(
+    "io", partial(ThreadPoolExecutor, thread_name_prefix="io"), IO_POOL_WORKERS, IO_POOL_QUEUE
+)
+cpu_pool = BoundedExecutor("cpu", ProcessPoolExecutor, CPU_POOL_WORKERS, CPU_POOL_QUEUE)
+# ffmpeg does the heavy lifting in its own process; these threads only feed
+# it, parse its progress and upload the result.
+transcode_pool = BoundedExecutor(
+    "transcode",
+    partial(ThreadPoolExecutor, thread_name_prefix="transcode"),
+    TRANSCODE_WORKERS,
+    TRANSCODE_QUEUE,
+)
+# Password hashing gets its own processes, so a burst of logins neither
+# blocks the event loop nor queues behind avatar resizing.
+auth_pool = BoundedExecutor("auth", ProcessPoolExecutor, AUTH_POOL_WORKERS, AUTH_POOL_QUEUE)
+
+
+async def run_io(func, *args, **kwargs):
+    return await io_pool.run(func, *args, **kwargs)
+
+
+async def run_cpu(func, *args, **kwargs):
+    return await cpu_pool.run(func, *args, **kwargs)
+
+
+async def run_auth(func, *args, **kwargs):
+    return await auth_pool.run(func, *args, **kwargs)
+
+
+def executor_stats() -> dict:
+    return {
+        "io": io_pool.stats(),
+        "cpu": cpu_pool.stats(),
+        "transcode": transcode_pool.stats(),
+        "auth": auth_pool.stats(),
+    }
+
+
+def shutdown_executors():
+    io_pool.shutdown()
+    cpu_pool.shutdown()
+    transcode_pool.shutdown()
+    auth_pool.shutdown()
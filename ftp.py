@@ -1,8 +1,15 @@
-from ftplib import FTP
+from ftplib import FTP, error_perm, error_temp
+from contextlib import contextmanager
+from collections import deque
 from io import BytesIO
+from typing import Generator, Iterator, Optional
+import threading
+import time
 import os
 import dotenv
 
+from .cache import content_cache
+
 dotenv.load_dotenv()
 
 FTP_HOST = os.getenv("FTP_HOST")
@@ -13,6 +20,196 @@ FTP_USER_MATERIALS = os.getenv("FTP_MATERIALS")
 FTP_USER_PFP = os.getenv("FTP_PFP")
 FTP_PASS = os.getenv("FTP_PASS")
 
+FTP_TIMEOUT = float(os.getenv("FTP_TIMEOUT", "30"))
+FTP_POOL_SIZE = int(os.getenv("FTP_POOL_SIZE", "4"))
+FTP_POOL_IDLE_TIMEOUT = float(os.getenv("FTP_POOL_IDLE_TIMEOUT", "300"))
+# Sessions idle for less than this are reused without a NOOP round trip
+FTP_POOL_CHECK_AFTER = float(os.getenv("FTP_POOL_CHECK_AFTER", "30"))
+FTP_CHUNK_SIZE = int(os.getenv("FTP_CHUNK_SIZE", str(64 * 1024)))
+
+
+def get_account(
+    isTeacher: bool = False,
+    isArticle: bool = False,
+    isMaterial: bool = False,
+    isPfp: bool = False,
+) -> str:
+    if isTeacher:
+        return FTP_TEACHER
+    elif isArticle:
+        return FTP_USER_ARTICLE
+    elif isMaterial:
+        return FTP_USER_MATERIALS
+    elif isPfp:
+        return FTP_USER_PFP
+    else:
+        return FTP_USER
+
+
+def _close(ftp: FTP):
+    try:
+        ftp.quit()
+    except Exception:
+        ftp.close()
+
+
+class FTPPool:
+    def __init__(self, account: str, size: int = FTP_POOL_SIZE, idle_timeout: float = FTP_POOL_IDLE_TIMEOUT):
+        self.account = account
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.overflow = 0
+
+    def _connect(self) -> FTP:
+        ftp = FTP(FTP_HOST, timeout=FTP_TIMEOUT)
+        try:
+            ftp.login(self.account, FTP_PASS)
+        except Exception:
+            ftp.close()
+            raise
+        self.created += 1
+        return ftp
+
+    def _discard(self, ftp: FTP):
+        self.discarded += 1
+        _close(ftp)
+
+    def _take_idle(self):
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                ftp, last_used = self._idle.pop()
+            idle_for = now - last_used
+            if idle_for > self.idle_timeout:
+                self._discard(ftp)
+                continue
+            if idle_for > FTP_POOL_CHECK_AFTER:
+                try:
+                    ftp.voidcmd("NOOP")
+                except Exception:
+                    self._discard(ftp)
+                    continue
+            self.reused += 1
+            return ftp
+
+    @contextmanager
+    def connection(self, fresh: bool = False) -> Generator[FTP, None, None]:
+        # `size` is how many idle sessions are kept, not a cap on concurrent
+        # ones: a stream holds its session for as long as the client reads,
+        # so when none is free an extra one is opened and closed after use.
+        ftp = None if fresh else self._take_idle()
+        if ftp is None:
+            ftp = self._connect()
+        with self._lock:
+            self.in_use += 1
+        try:
+            yield ftp
+        except error_perm:
+            # The session itself is fine (e.g. 550 file not found)
+            self._release(ftp)
+            raise
+        except BaseException:
+            self._discard(ftp)
+            raise
+        else:
+            self._release(ftp)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+
+    def _release(self, ftp: FTP):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((ftp, time.monotonic()))
+                return
+            self.overflow += 1
+        _close(ftp)
+
+    def prune(self):
+        now = time.monotonic()
+        with self._lock:
+            alive = deque(item for item in self._idle if now - item[1] <= self.idle_timeout)
+            expired = [item[0] for item in self._idle if now - item[1] > self.idle_timeout]
+            self._idle = alive
+        for ftp in expired:
+            self._discard(ftp)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for ftp, _ in idle:
+            _close(ftp)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "in_use": self.in_use,
+            "created": self.created,
+            "reused": self.reused,
+            "discarded": self.discarded,
+            "overflow": self.overflow,
+        }
+
+
+_pools: dict[str, FTPPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(account: str) -> FTPPool:
+    with _pools_lock:
+        pool = _pools.get(account)
+        if pool is None:
+            pool = _pools[account] = FTPPool(account)
+        return pool
+
+
+def pool_stats() -> dict:
+    return {account: pool.stats() for account, pool in _pools.items()}
+
+
+def prune_pools():
+    # Closes sessions idle past FTP_POOL_IDLE_TIMEOUT before the server drops them
+    for pool in list(_pools.values()):
+        pool.prune()
+
+
+def close_pools():
+    for pool in list(_pools.values()):
+        pool.close_all()
+
+
+@contextmanager
+def connection(
+    isTeacher: bool = False,
+    isArticle: bool = False,
+    isMaterial: bool = False,
+    isPfp: bool = False,
+) -> Generator[FTP, None, None]:
+    with get_pool(get_account(isTeacher, isArticle, isMaterial, isPfp)).connection() as ftp:
+        yield ftp
+
+
+def _with_retry(pool: FTPPool, action):
+    # A pooled session may have been dropped by the server since its last use;
+    # retry once on a freshly logged-in session before giving up.
+    try:
+        with pool.connection() as ftp:
+            return action(ftp)
+    except error_perm:
+        raise
+    except Exception:
+        with pool.connection(fresh=True) as ftp:
+            return action(ftp)
+
 
 def upload(
     filename: str,
@@ -22,21 +219,15 @@ def upload(
     isMaterial: bool = False,
     isPfp: bool = False,
 ) -> bool:
-    with FTP(FTP_HOST) as ftp:
-        if isTeacher:
-            ftp.login(FTP_TEACHER, FTP_PASS)
-        elif isArticle:
-            ftp.login(FTP_USER_ARTICLE, FTP_PASS)
-        elif isMaterial:
-            ftp.login(FTP_USER_MATERIALS, FTP_PASS)
-        elif isPfp:
-            ftp.login(FTP_USER_PFP, FTP_PASS)
-        else:
-            ftp.login(FTP_USER, FTP_PASS)
+    def action(ftp: FTP) -> bool:
         with BytesIO(content) as file:
             ftp.storbinary(f"STOR {filename}", file)
             return True
 
+    account = get_account(isTeacher, isArticle, isMaterial, isPfp)
+    content_cache.invalidate(account, filename)
+    return _with_retry(get_pool(account), action)
+
 
 def download(
     filename: str,
@@ -45,22 +236,25 @@ def download(
     isMaterial: bool = False,
     isPfp: bool = False,
 ) -> bytes:
-    with FTP(FTP_HOST) as ftp:
-        if isTeacher:
-            ftp.login(FTP_TEACHER, FTP_PASS)
-        elif isArticle:
-            ftp.login(FTP_USER_ARTICLE, FTP_PASS)
-        elif isMaterial:
-            ftp.login(FTP_USER_MATERIALS, FTP_PASS)
-        elif isPfp:
-            ftp.login(FTP_USER_PFP, FTP_PASS)
-        else:
-            ftp.login(FTP_USER, FTP_PASS)
+    def action(ftp: FTP) -> bytes:
         with BytesIO() as file:
             ftp.retrbinary(f"RETR {filename}", file.write)
             file.seek(0)
             return file.read()
 
+    account = get_account(isTeacher, isArticle, isMaterial, isPfp)
+    cached_path = content_cache.get(account, filename)
+    if cached_path is not None:
+        try:
+            with open(cached_path, "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            pass
+
+    content = _with_retry(get_pool(account), action)
+    content_cache.put(account, filename, content)
+    return content
+
 
 def delete(
     filename: str,
@@ -69,15 +263,139 @@ def delete(
     isMaterial: bool = False,
     isPfp: bool = False,
 ):
-    with FTP(FTP_HOST) as ftp:
-        if isTeacher:
-            ftp.login(FTP_TEACHER, FTP_PASS)
-        elif isArticle:
-            ftp.login(FTP_USER_ARTICLE, FTP_PASS)
-        elif isMaterial:
-            ftp.login(FTP_USER_MATERIALS, FTP_PASS)
-        elif isPfp:
-            ftp.login(FTP_USER_PFP, FTP_PASS)
+    account = get_account(isTeacher, isArticle, isMaterial, isPfp)
+    content_cache.invalidate(account, filename)
+    return _with_retry(get_pool(account), lambda ftp: ftp.delete(filename))
+
+
+def size(
+    filename: str,
+    isTeacher: bool = False,
+    isArticle: bool = False,
+    isMaterial: bool = False,
+    isPfp: bool = False,
+) -> int:
+    def action(ftp: FTP) -> int:
+        ftp.voidcmd("TYPE I")
+        return ftp.size(filename)
+
+    account = get_account(isTeacher, isArticle, isMaterial, isPfp)
+    cached_path = content_cache.get(account, filename, record=False)
+    if cached_path is not None:
+        try:
+            return os.path.getsize(cached_path)
+        except FileNotFoundError:
+            pass
+    return _with_retry(get_pool(account), action)
+
+
+def _stream(
+    pool: FTPPool,
+    filename: str,
+    chunk_size: int,
+    rest: Optional[int],
+    length: Optional[int],
+    fresh: bool,
+) -> Generator[bytes, None, None]:
+    with pool.connection(fresh=fresh) as ftp:
+        ftp.voidcmd("TYPE I")
+        remaining = length
+        with ftp.transfercmd(f"RETR {filename}", rest) as conn:
+            while remaining is None or remaining > 0:
+                data = conn.recv(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not data:
+                    break
+                if remaining is not None:
+                    remaining -= len(data)
+                yield data
+        if remaining is not None and remaining <= 0:
+            # We closed the data connection before the server finished, so it
+            # may answer 426 instead of 226; either way the session is reusable.
+            try:
+                ftp.voidresp()
+            except error_temp:
+                pass
+        else:
+            ftp.voidresp()
+
+
+def stream(
+    filename: str,
+    isTeacher: bool = False,
+    isArticle: bool = False,
+    isMaterial: bool = False,
+    isPfp: bool = False,
+    chunk_size: int = FTP_CHUNK_SIZE,
+    rest: Optional[int] = None,
+    length: Optional[int] = None,
+) -> Iterator[bytes]:
+    account = get_account(isTeacher, isArticle, isMaterial, isPfp)
+    cached_path = content_cache.get(account, filename)
+    if cached_path is not None:
+        try:
+            file = open(cached_path, "rb")
+        except FileNotFoundError:
+            pass
+        else:
+            return _stream_file(file, chunk_size, rest, length)
+
+    pool = get_pool(account)
+
+    # Open the transfer eagerly so a missing file or a dead session surfaces
+    # here, before the response has started, instead of mid-stream.
+    try:
+        chunks = _stream(pool, filename, chunk_size, rest, length, fresh=False)
+        first = next(chunks, None)
+    except error_perm:
+        raise
+    except Exception:
+        chunks = _stream(pool, filename, chunk_size, rest, length, fresh=True)
+        first = next(chunks, None)
+
+    def generate() -> Generator[bytes, None, None]:
+        try:
+            if first is not None:
+                yield first
+            yield from chunks
+        finally:
+            chunks.close()
+
+    if rest is None and length is None and content_cache.enabled:
+        return _stream_into_cache(generate(), account, filename)
+    return generate()
+
+
+def _stream_file(
+    file, chunk_size: int, rest: Optional[int], length: Optional[int]
+) -> Generator[bytes, None, None]:
+    with file:
+        if rest:
+            file.seek(rest)
+        remaining = length
+        while remaining is None or remaining > 0:
+            data = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            yield data
+
+
+def _stream_into_cache(
+    chunks: Iterator[bytes], account: str, filename: str
+) -> Generator[bytes, None, None]:
+    # Tee a full download into the cache; only a transfer that ran to the end
+    # is committed, an aborted one just drops its partial file.
+    temp = content_cache.temp_file()
+    completed = False
+    try:
+        with temp:
+            for data in chunks:
+                temp.write(data)
+                yield data
+        completed = True
+    finally:
+        if completed:
+            content_cache.put_file(account, filename, temp.name)
         else:
-            ftp.login(FTP_USER, FTP_PASS)
-        ftp.delete(filename)
+            os.remove(temp.name)
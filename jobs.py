@@ -0,0 +1,216 @@
+from datetime import datetime, timedelta
+from typing import Optional
+import tempfile
+import uuid
+import os
+import dotenv
+
+from ftplib import error_perm
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from .database.database import SessionLocal
+from .executor import transcode_pool
+from .ftp import upload, delete, size
+from .models.models import Material, PengenalanReaksi, TranscodeJob
+from .schemas import schemas, utils
+
+dotenv.load_dotenv()
+
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+# A PROCESSING row untouched for longer than any transcode takes lost its
+# job to a restart
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "3600"))
+
+# Models whose videos are transcoded, with their job kind and the FTP
+# account they live on
+TRANSCODED_MODELS = [
+    (Material, "material", {"isTeacher": True}),
+    (PengenalanReaksi, "introduction", {}),
+]
+
+
+class Job:
+    # What the worker needs to run the transcode; the status clients poll
+    # is kept in the TranscodeJobs table
+    def __init__(
+        self,
+        kind: str,
+        model,
+        target_id: int,
+        owner_id: int,
+        input_file: utils.SavedUpload,
+        filename: str,
+        account: dict,
+        values: Optional[dict] = None,
+        old_filename: Optional[str] = None,
+    ):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.model = model
+        self.target_id = target_id
+        self.owner_id = owner_id
+        self.input_file = input_file
+        self.filename = filename
+        self.account = account
+        self.values = values or {}
+        self.old_filename = old_filename
+        self.progress = 0.0
+
+    def _save(self, **values):
+        with SessionLocal() as db:
+            db.execute(
+                update(TranscodeJob)
+                .where(TranscodeJob.job_id == self.job_id)
+                .values(updated_at=datetime.now(), **values)
+            )
+            db.commit()
+
+    def set_status(self, status: str, error: Optional[str] = None):
+        self._save(status=status, progress=self.progress, error=error)
+
+    def set_progress(self, progress: float):
+        # ffmpeg reports many times a second; only whole percents are written
+        if int(progress) == int(self.progress):
+            return
+        self.progress = round(progress, 1)
+        self._save(progress=self.progress)
+
+
+def get_job(db: Session, job_id: str) -> Optional[TranscodeJob]:
+    return db.get(TranscodeJob, job_id)
+
+
+def _prune(db: Session):
+    expired_before = datetime.now() - timedelta(seconds=JOB_RETENTION_SECONDS)
+    db.query(TranscodeJob).filter(
+        TranscodeJob.status.in_(("DONE", "FAILED")), TranscodeJob.updated_at < expired_before
+    ).delete(synchronize_session=False)
+
+
+def submit_transcode(
+    kind: str,
+    model,
+    target_id: int,
+    owner_id: int,
+    input_file: utils.SavedUpload,
+    filename: str,
+    account: Optional[dict] = None,
+    values: Optional[dict] = None,
+    old_filename: Optional[str] = None,
+) -> Job:
+    job = Job(
+        kind, model, target_id, owner_id, input_file, filename, account or {}, values, old_filename
+    )
+    with SessionLocal() as db:
+        _prune(db)
+        db.add(TranscodeJob(job_id=job.job_id, kind=kind, target_id=target_id, owner_id=owner_id))
+        db.commit()
+    try:
+        transcode_pool.submit(_process, job)
+    except BaseException:
+        # Rejected by a full queue; nothing will pick the upload up
+        input_file.discard()
+        with SessionLocal() as db:
+            db.query(TranscodeJob).filter(TranscodeJob.job_id == job.job_id).delete()
+            db.commit()
+        raise
+    return job
+
+
+def _process(job: Job):
+    compressed_file_path = f"{tempfile.gettempdir()}/compressed_{job.filename}"
+    try:
+        job.set_status("PROCESSING")
+        utils.compress_video(job.input_file.path, compressed_file_path, on_progress=job.set_progress)
+
+        job.set_status("UPLOADING")
+        with open(compressed_file_path, "rb") as buffer:
+            upload(job.filename, buffer.read(), **job.account)
+        thumbnail = utils.create_video_thumbnail(compressed_file_path, job.filename, **job.account)
+
+        stale_files = []
+        with SessionLocal() as db:
+            row = db.get(job.model, job.target_id)
+            if row is None:
+                # The post was deleted while it was being transcoded
+                stale_files += [job.filename, thumbnail]
+            else:
+                if row.thumbnail:
+                    stale_files.append(row.thumbnail)
+                for key, value in job.values.items():
+                    setattr(row, key, value)
+                row.filename = job.filename
+                row.thumbnail = thumbnail
+                row.media_status = "READY"
+                row.updated_at = datetime.now()
+                db.commit()
+        if job.old_filename is not None:
+            stale_files.append(job.old_filename)
+
+        for filename in stale_files:
+            try:
+                delete(filename, **job.account)
+            except Exception:
+                pass
+
+        job.progress = 100.0
+        job.set_status("DONE")
+    except Exception as e:
+        try:
+            job.set_status("FAILED", error=str(e))
+            with SessionLocal() as db:
+                row = db.get(job.model, job.target_id)
+                if row is not None:
+                    # An update keeps serving the previous video
+                    row.media_status = "READY" if job.old_filename else "FAILED"
+                    db.commit()
+        except Exception:
+            pass
+    finally:
+        job.input_file.discard()
+        if os.path.exists(compressed_file_path):
+            os.remove(compressed_file_path)
+
+
+def recover_stale_jobs():
+    # A restarted worker leaves its jobs unfinished and their rows in
+    # PROCESSING. Running jobs write their progress, so a job untouched for
+    # JOB_STALE_SECONDS is lost. An interrupted update still points at the
+    # previous video, so a row whose file is on the server is READY again,
+    # otherwise FAILED.
+    stale_before = datetime.now() - timedelta(seconds=JOB_STALE_SECONDS)
+    with SessionLocal() as db:
+        db.execute(
+            update(TranscodeJob)
+            .where(
+                TranscodeJob.status.not_in(("DONE", "FAILED")), TranscodeJob.updated_at < stale_before
+            )
+            .values(status="FAILED", error="Job terhenti", updated_at=datetime.now())
+        )
+        db.commit()
+        running = {
+            (kind, target_id)
+            for kind, target_id in db.execute(
+                select(TranscodeJob.kind, TranscodeJob.target_id).where(
+                    TranscodeJob.status.not_in(("DONE", "FAILED"))
+                )
+            )
+        }
+    for model, kind, account in TRANSCODED_MODELS:
+        primary_key = model.__mapper__.primary_key[0]
+        with SessionLocal() as db:
+            rows = db.scalars(
+                select(model).where(
+                    model.media_status == "PROCESSING", model.updated_at < stale_before
+                )
+            ).all()
+            for row in rows:
+                if (kind, getattr(row, primary_key.key)) in running:
+                    continue
+                try:
+                    size(row.filename, **account)
+                    row.media_status = "READY"
+                except error_perm:
+                    row.media_status = "FAILED"
+            db.commit()
@@ -1,23 +1,32 @@
 from fastapi import FastAPI
-from .ftp import FTP_HOST, FTP_USER, FTP_PASS, FTP
+from .ftp import connection, close_pools, prune_pools
+from .executor import run_io, shutdown_executors
+from .middleware import BodySizeLimitMiddleware
 from .database import database
-from .routers import articles, exercises, materials, users, students, auth, introduction
-from .models import models
+from .jobs import recover_stale_jobs
+from .routers import articles, exercises, materials, users, students, auth, introduction, internal, jobs
 from contextlib import asynccontextmanager
+from sqlalchemy import text
 import asyncio
 
 
-models.Base.metadata.create_all(bind=database.engine)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    def ping():
+        prune_pools()
+        with connection() as ftp:
+            ftp.voidcmd("NOOP")
+        with database.SessionLocal() as db:
+            # Send a simple query to keep the connection alive
+            db.execute(text("SELECT 1"))
+        recover_stale_jobs()
+
     async def keep_alive():
         while True:
-            with FTP(FTP_HOST) as ftp:
-                ftp.login(FTP_USER, FTP_PASS)
-                ftp.voidcmd("NOOP")
-            with database.SessionLocal() as db:
-                # Send a simple query to keep the connection alive
-                db.execute("SELECT 1")
+            try:
+                await run_io(ping)
+            except Exception:
+                pass  # Retried on the next round
             await asyncio.sleep(900)  # Keep-alive every 15 minutes (900 seconds)
 
     # Create a background task to keep the connection alive
@@ -28,8 +37,14 @@ async def lifespan(app: FastAPI):
         await task
     except asyncio.CancelledError:
         pass
+    close_pools()
+    shutdown_executors()
+    await database.async_engine.dispose()
+    if database.async_replica_engine is not None:
+        await database.async_replica_engine.dispose()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(BodySizeLimitMiddleware)
 
 
 app.include_router(users.router, prefix="/v1/users", tags=["users"])
@@ -39,6 +54,8 @@ app.include_router(exercises.router, prefix="/v1/exercises", tags=["exercises"])
 app.include_router(students.router, prefix="/v1", tags=["students"])
 app.include_router(introduction.router, prefix="/v1/introduction", tags=["introduction"])
 app.include_router(articles.router, prefix="/v1/articles", tags=["articles"])
+app.include_router(jobs.router, prefix="/v1/jobs", tags=["jobs"])
+app.include_router(internal.router, prefix="/v1/internal", tags=["internal"])
 
 @app.get("/")
 async def root():
@@ -0,0 +1,66 @@
+from fastapi import HTTPException
+import re
+import os
+import dotenv
+
+from .schemas.utils import IMAGE_MAX_SIZE, VIDEO_MAX_SIZE
+
+dotenv.load_dotenv()
+
+# Requests without a file upload
+MAX_REQUEST_BODY_SIZE = int(os.getenv("MAX_REQUEST_BODY_SIZE", str(2 * 1024 * 1024)))
+# Room for the form fields sent along with a file
+FORM_FIELDS_SIZE = 1024 * 1024
+
+# Upload routes get their file limit instead, so an oversized image is cut
+# off after IMAGE_MAX_SIZE bytes rather than after a whole video's worth.
+UPLOAD_LIMITS = [
+    ("POST", re.compile(r"^/v1/articles/?$"), IMAGE_MAX_SIZE),
+    ("PUT", re.compile(r"^/v1/articles/\d+/?$"), IMAGE_MAX_SIZE),
+    ("PUT", re.compile(r"^/v1/users/\d+/?$"), IMAGE_MAX_SIZE),
+    ("POST", re.compile(r"^/v1/materials/?$"), VIDEO_MAX_SIZE),
+    ("PUT", re.compile(r"^/v1/materials/\d+/?$"), VIDEO_MAX_SIZE),
+    ("POST", re.compile(r"^/v1/introduction/?$"), VIDEO_MAX_SIZE),
+    ("PUT", re.compile(r"^/v1/introduction/?$"), VIDEO_MAX_SIZE),
+]
+
+
+def body_size_limit(method: str, path: str, default: int = MAX_REQUEST_BODY_SIZE) -> int:
+    for route_method, pattern, max_file_size in UPLOAD_LIMITS:
+        if method == route_method and pattern.match(path):
+            return max_file_size + FORM_FIELDS_SIZE
+    return default
+
+
+class BodySizeLimitMiddleware:
+    # Counts request body bytes as they arrive so an oversized upload is cut
+    # off before Starlette has spooled all of it to disk. The HTTPException is
+    # raised from inside receive(), which FastAPI passes through body parsing
+    # unchanged and answers with 413.
+    def __init__(self, app, max_body_size: int = MAX_REQUEST_BODY_SIZE):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        max_body_size = body_size_limit(scope["method"], scope["path"], self.max_body_size)
+        content_length = dict(scope["headers"]).get(b"content-length")
+        received = 0
+
+        def too_large():
+            return HTTPException(status_code=413, detail="Ukuran request terlalu besar!")
+
+        async def limited_receive():
+            nonlocal received
+            if content_length is not None and content_length.isdigit() and int(content_length) > max_body_size:
+                raise too_large()
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_size:
+                    raise too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
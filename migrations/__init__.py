@@ -0,0 +1,84 @@
+from sqlalchemy import Column, Index, MetaData, String, Table, TIMESTAMP, inspect, select, insert
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql import func
+from typing import List
+import importlib
+import pkgutil
+import re
+
+from ..database.database import engine as default_engine
+
+# Applied versions are recorded here, one row per migration module
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", String(255), primary_key=True),
+    Column("applied_at", TIMESTAMP, server_default=func.current_timestamp()),
+)
+
+_VERSION_MODULE = re.compile(r"^v\d{4}_\w+$")
+
+
+def _versions() -> List[str]:
+    return sorted(
+        module.name for module in pkgutil.iter_modules(__path__) if _VERSION_MODULE.match(module.name)
+    )
+
+
+def applied_versions(conn: Connection) -> set:
+    schema_migrations.create(conn, checkfirst=True)
+    return set(conn.scalars(select(schema_migrations.c.version)))
+
+
+def upgrade(engine: Engine = default_engine) -> List[str]:
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+
+    applied = []
+    for version in _versions():
+        if version in done:
+            continue
+        module = importlib.import_module(f"{__name__}.{version}")
+        # MySQL commits DDL implicitly, so every operation below is written
+        # to be safe to re-run if a migration stops halfway.
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.execute(insert(schema_migrations).values(version=version))
+        applied.append(version)
+    return applied
+
+
+def has_column(conn: Connection, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def has_index(conn: Connection, table: str, columns: List[str], unique: bool = False) -> bool:
+    # Any index that leads with these columns will do, e.g. the one InnoDB
+    # creates for a foreign key; a unique one must cover exactly them.
+    inspector = inspect(conn)
+    if unique:
+        existing = [i for i in inspector.get_indexes(table) if i["unique"]]
+        existing += inspector.get_unique_constraints(table)
+        return any(index["column_names"] == columns for index in existing)
+    existing = inspector.get_indexes(table) + inspector.get_unique_constraints(table)
+    return any(index["column_names"][: len(columns)] == columns for index in existing)
+
+
+def add_column(conn: Connection, column: Column):
+    table = column.table
+    if has_column(conn, table.name, column.name):
+        return
+    preparer = conn.dialect.identifier_preparer
+    conn.exec_driver_sql(
+        f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+        f"{CreateColumn(column).compile(dialect=conn.dialect)}"
+    )
+
+
+def create_index(conn: Connection, table: str, name: str, columns: List[str], unique: bool = False):
+    if has_index(conn, table, columns, unique=unique):
+        return
+    # CREATE INDEX only needs the names, so no column types are declared
+    detached = Table(table, MetaData(), *[Column(column) for column in columns])
+    Index(name, *[detached.c[column] for column in columns], unique=unique).create(conn)
@@ -0,0 +1,10 @@
+from . import upgrade
+
+
+if __name__ == "__main__":
+    applied = upgrade()
+    if applied:
+        for version in applied:
+            print(f"Migrasi diterapkan: {version}")
+    else:
+        print("Skema sudah terbaru.")
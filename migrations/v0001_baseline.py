@@ -0,0 +1,133 @@
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Enum,
+    Float,
+    ForeignKey,
+    Integer,
+    JSON,
+    MetaData,
+    String,
+    Table,
+    Text,
+    TIMESTAMP,
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import func
+
+# The schema as create_all built it before migrations existed, frozen here
+# so later changes to the models never change what the baseline creates.
+metadata = MetaData()
+
+
+def _timestamp(name: str, on_update: bool = False) -> Column:
+    if on_update:
+        return Column(name, TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
+    return Column(name, TIMESTAMP, server_default=func.current_timestamp())
+
+
+Table(
+    "Users", metadata,
+    Column("user_id", Integer, primary_key=True, autoincrement=True),
+    Column("full_name", String(255), nullable=False),
+    Column("username", String(255), unique=True, nullable=False),
+    Column("email", String(255), unique=True, nullable=False),
+    Column("password", String(255), default=""),
+    Column("user_type", Integer, nullable=False),
+    Column("registration_status", Enum("PENDING", "APPROVED"), default="PENDING"),
+    Column("school", String(255), nullable=False),
+    Column("profile_picture", String(255)),
+    _timestamp("registration_date"),
+    _timestamp("updated_at", on_update=True),
+)
+
+Table(
+    "Teachers", metadata,
+    Column("teacher_id", Integer, ForeignKey("Users.user_id", ondelete="CASCADE", onupdate="CASCADE"), primary_key=True),
+    Column("nip", String(255), unique=True, nullable=False),
+)
+
+Table(
+    "Students", metadata,
+    Column("student_id", Integer, ForeignKey("Users.user_id", ondelete="CASCADE", onupdate="CASCADE"), primary_key=True),
+    Column("nisn", String(255), unique=True, nullable=False),
+)
+
+Table(
+    "Materials", metadata,
+    Column("material_id", Integer, primary_key=True, autoincrement=True),
+    Column("title", String(255), nullable=False),
+    Column("media_type", Enum("image", "video"), nullable=False),
+    Column("filename", String(255), nullable=False),
+    Column("description", Text),
+    Column("author_id", Integer, ForeignKey("Users.user_id")),
+    Column("approval_status", Enum("PENDING", "APPROVED", "REJECTED"), default="PENDING"),
+    _timestamp("created_at"),
+    _timestamp("updated_at", on_update=True),
+)
+
+Table(
+    "Exercises", metadata,
+    Column("exercise_id", Integer, primary_key=True, autoincrement=True),
+    Column("title", String(255), nullable=False),
+    Column("difficulty", Enum("Mudah", "Sedang", "Sulit"), nullable=False),
+    Column("question_count", Integer, nullable=False),
+    Column("author_id", Integer, ForeignKey("Users.user_id")),
+    Column("approval_status", Enum("PENDING", "APPROVED", "REJECTED", "DRAFT"), default="PENDING"),
+    _timestamp("created_at"),
+    _timestamp("updated_at", on_update=True),
+)
+
+Table(
+    "Questions", metadata,
+    Column("question_id", Integer, primary_key=True, autoincrement=True),
+    Column("exercise_id", Integer, ForeignKey("Exercises.exercise_id", ondelete="CASCADE", onupdate="CASCADE"), nullable=False),
+    Column("question_text", Text, nullable=False),
+    Column("option_text", JSON, nullable=False),
+    Column("answer_keys", JSON, nullable=False),
+)
+
+Table(
+    "StudentExerciseResults", metadata,
+    Column("result_id", Integer, primary_key=True, autoincrement=True),
+    Column("student_id", Integer, ForeignKey("Users.user_id"), nullable=False),
+    Column("exercise_id", Integer, ForeignKey("Exercises.exercise_id"), nullable=False),
+    Column("score", Float, nullable=False),
+    _timestamp("completion_date"),
+)
+
+Table(
+    "StudentAnswers", metadata,
+    Column("answer_id", Integer, primary_key=True, autoincrement=True),
+    Column("result_id", Integer, ForeignKey("StudentExerciseResults.result_id", ondelete="CASCADE", onupdate="CASCADE"), nullable=False),
+    Column("question_id", Integer, ForeignKey("Questions.question_id", ondelete="CASCADE", onupdate="CASCADE"), nullable=False),
+    Column("selected_option", JSON, nullable=False),
+    Column("is_correct", Boolean, nullable=False),
+)
+
+Table(
+    "ArtikelReaksi", metadata,
+    Column("article_id", Integer, primary_key=True, autoincrement=True),
+    Column("author_id", Integer, ForeignKey("Users.user_id", ondelete="CASCADE", onupdate="CASCADE"), nullable=False),
+    Column("title", String(255), nullable=False),
+    Column("filename", String(255), nullable=False),
+    Column("description", Text, nullable=False),
+    Column("approval_status", Enum("PENDING", "APPROVED", "REJECTED"), default="PENDING"),
+    _timestamp("created_at"),
+    _timestamp("updated_at", on_update=True),
+)
+
+Table(
+    "PengenalanReaksi", metadata,
+    Column("intro_id", Integer, primary_key=True, autoincrement=True),
+    Column("filename", String(255), nullable=False),
+    Column("title", String(255), nullable=False),
+    Column("description", Text, nullable=False),
+    _timestamp("created_at"),
+    _timestamp("updated_at", on_update=True),
+)
+
+
+def upgrade(conn: Connection):
+    # On an existing database this is a no-op
+    metadata.create_all(bind=conn, checkfirst=True)
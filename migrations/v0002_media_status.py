@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Enum, MetaData, String, Table, update
+from sqlalchemy.engine import Connection
+
+from . import add_column
+
+
+def upgrade(conn: Connection):
+    # Columns added for background transcoding and stored thumbnails,
+    # declared here so later model changes leave this migration alone
+    for name in ("Materials", "PengenalanReaksi"):
+        table = Table(
+            name,
+            MetaData(),
+            Column("thumbnail", String(255)),
+            Column("media_status", Enum("PROCESSING", "READY", "FAILED"), default="READY"),
+        )
+        add_column(conn, table.c.thumbnail)
+        add_column(conn, table.c.media_status)
+        conn.execute(
+            update(table).where(table.c.media_status.is_(None)).values(media_status="READY")
+        )
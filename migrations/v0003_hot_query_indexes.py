@@ -0,0 +1,45 @@
+from sqlalchemy import column, delete, func, select, table
+from sqlalchemy.engine import Connection
+
+from . import create_index
+
+
+INDEXES = [
+    # Approved lists and the moderation queue
+    ("Materials", "ix_materials_status_updated", ["approval_status", "updated_at"]),
+    ("Exercises", "ix_exercises_status_updated", ["approval_status", "updated_at"]),
+    ("ArtikelReaksi", "ix_articles_status_updated", ["approval_status", "updated_at"]),
+    # A teacher's own posts
+    ("Materials", "ix_materials_author_updated", ["author_id", "updated_at"]),
+    ("Exercises", "ix_exercises_author_updated", ["author_id", "updated_at"]),
+    ("ArtikelReaksi", "ix_articles_author_updated", ["author_id", "updated_at"]),
+    # Practice questions and result details
+    ("Questions", "ix_questions_exercise", ["exercise_id"]),
+    ("StudentAnswers", "ix_student_answers_result", ["result_id"]),
+]
+
+results = table(
+    "StudentExerciseResults", column("result_id"), column("student_id"), column("exercise_id")
+)
+answers = table("StudentAnswers", column("result_id"))
+
+
+def upgrade(conn: Connection):
+    for table_name, name, columns in INDEXES:
+        create_index(conn, table_name, name, columns)
+
+    # Keep the first attempt where a double submit already slipped in,
+    # together with its answers; later attempts are removed.
+    first_attempts = (
+        select(func.min(results.c.result_id))
+        .group_by(results.c.student_id, results.c.exercise_id)
+        .scalar_subquery()
+    )
+    duplicates = conn.scalars(
+        select(results.c.result_id).where(results.c.result_id.not_in(first_attempts))
+    ).all()
+    if duplicates:
+        conn.execute(delete(answers).where(answers.c.result_id.in_(duplicates)))
+        conn.execute(delete(results).where(results.c.result_id.in_(duplicates)))
+
+    create_index(conn, "StudentExerciseResults", "uq_student_exercise", ["student_id", "exercise_id"], unique=True)
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, MetaData, Table
+from sqlalchemy.engine import Connection
+
+from . import add_column
+
+users = Table(
+    "Users",
+    MetaData(),
+    Column("token_version", Integer, nullable=False, default=0, server_default="0"),
+)
+
+
+def upgrade(conn: Connection):
+    add_column(conn, users.c.token_version)
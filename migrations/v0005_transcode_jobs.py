@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Enum, Float, Index, Integer, MetaData, String, Table, Text, TIMESTAMP
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import func
+
+# Job status used to live in the memory of the worker that took the upload
+transcode_jobs = Table(
+    "TranscodeJobs",
+    MetaData(),
+    Column("job_id", String(32), primary_key=True),
+    Column("kind", String(32), nullable=False),
+    Column("target_id", Integer, nullable=False),
+    Column("owner_id", Integer, nullable=False),
+    Column("status", Enum("QUEUED", "PROCESSING", "UPLOADING", "DONE", "FAILED"), nullable=False, default="QUEUED"),
+    Column("progress", Float, nullable=False, default=0.0),
+    Column("error", Text),
+    Column("created_at", TIMESTAMP, server_default=func.current_timestamp()),
+    Column("updated_at", TIMESTAMP, server_default=func.current_timestamp()),
+    Index("ix_transcode_jobs_status_updated", "status", "updated_at"),
+)
+
+
+def upgrade(conn: Connection):
+    transcode_jobs.create(conn, checkfirst=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Enum, Text, ForeignKey, TIMESTAMP, JSON, Float, Boolean
+from sqlalchemy import Column, Integer, String, Enum, Text, ForeignKey, TIMESTAMP, JSON, Float, Boolean, UniqueConstraint, Index
 from sqlalchemy.orm import relationship, declarative_base
 from ..database.database import Base
 from sqlalchemy.sql import func
@@ -16,6 +16,8 @@ class User(Base):
     profile_picture = Column(String(255))
     registration_date = Column(TIMESTAMP, server_default=func.current_timestamp())
     updated_at = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
+    # Bumped when the password or email changes to revoke older tokens
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
 
 class Teacher(Base):
     __tablename__ = 'Teachers'
@@ -35,12 +37,18 @@ class Material(Base):
     title = Column(String(255), nullable=False)
     media_type = Column(Enum('image', 'video'), nullable=False)
     filename = Column(String(255), nullable=False)
+    thumbnail = Column(String(255))
     description = Column(Text)
     author_id = Column(Integer, ForeignKey('Users.user_id'))
     approval_status = Column(Enum('PENDING', 'APPROVED', 'REJECTED'), default='PENDING')
+    media_status = Column(Enum('PROCESSING', 'READY', 'FAILED'), default='READY')
     author = relationship("User", backref="materials")
     created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
     updated_at = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
+    __table_args__ = (
+        Index('ix_materials_status_updated', 'approval_status', 'updated_at'),
+        Index('ix_materials_author_updated', 'author_id', 'updated_at'),
+    )
 
 class Exercise(Base):
     __tablename__ = 'Exercises'
@@ -54,6 +62,10 @@ class Exercise(Base):
     author = relationship("User", backref="exercise")
     created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
     updated_at = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
+    __table_args__ = (
+        Index('ix_exercises_status_updated', 'approval_status', 'updated_at'),
+        Index('ix_exercises_author_updated', 'author_id', 'updated_at'),
+    )
 
 
 class Question(Base):
@@ -63,6 +75,7 @@ class Question(Base):
     question_text = Column(Text, nullable=False)
     option_text = Column(JSON, nullable=False)
     answer_keys = Column(JSON, nullable=False)
+    __table_args__ = (Index('ix_questions_exercise', 'exercise_id'),)
 
 class StudentExerciseResult(Base):
     __tablename__ = 'StudentExerciseResults'
@@ -73,6 +86,9 @@ class StudentExerciseResult(Base):
     completion_date = Column(TIMESTAMP, server_default=func.current_timestamp())
     student = relationship("User", backref="exercise_results")
     exercise = relationship("Exercise", backref="exercise_results")
+    # One attempt per student and exercise, enforced by the database so
+    # concurrent submissions cannot both get in
+    __table_args__ = (UniqueConstraint('student_id', 'exercise_id', name='uq_student_exercise'),)
 
 class StudentAnswer(Base):
     __tablename__ = 'StudentAnswers'
@@ -83,6 +99,7 @@ class StudentAnswer(Base):
     is_correct = Column(Boolean, nullable=False)
     result = relationship("StudentExerciseResult", backref="answers", cascade="all, delete")
     question = relationship("Question", backref="answers", cascade="all, delete")
+    __table_args__ = (Index('ix_student_answers_result', 'result_id'),)
 
 class ReactionArticle(Base):
     __tablename__ = 'ArtikelReaksi'
@@ -95,12 +112,31 @@ class ReactionArticle(Base):
     created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
     updated_at = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
     author = relationship("User", backref="reaction_articles")
+    __table_args__ = (
+        Index('ix_articles_status_updated', 'approval_status', 'updated_at'),
+        Index('ix_articles_author_updated', 'author_id', 'updated_at'),
+    )
 
 class PengenalanReaksi(Base):
     __tablename__ = 'PengenalanReaksi'
     intro_id = Column(Integer, primary_key=True, autoincrement=True)
     filename = Column(String(255), nullable=False)
+    thumbnail = Column(String(255))
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=False)
+    media_status = Column(Enum('PROCESSING', 'READY', 'FAILED'), default='READY')
     created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
-    updated_at = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
\ No newline at end of file
+    updated_at = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
+class TranscodeJob(Base):
+    # Shared by every worker, so any of them can answer a status poll
+    __tablename__ = 'TranscodeJobs'
+    job_id = Column(String(32), primary_key=True)
+    kind = Column(String(32), nullable=False)
+    target_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, nullable=False)
+    status = Column(Enum('QUEUED', 'PROCESSING', 'UPLOADING', 'DONE', 'FAILED'), nullable=False, default='QUEUED')
+    progress = Column(Float, nullable=False, default=0.0)
+    error = Column(Text)
+    created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
+    updated_at = Column(TIMESTAMP, server_default=func.current_timestamp())
+    __table_args__ = (Index('ix_transcode_jobs_status_updated', 'status', 'updated_at'),)
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, HTTPException, status, File, UploadFile, Form
 from fastapi.responses import StreamingResponse
 from ..schemas import schemas
-from ..models.models import User, Teacher, ReactionArticle
+from ..models.models import User, ReactionArticle
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
 from ..schemas import utils
-from ..dependencies.dependencies import db_dependency, current_user_dependency
-from ..ftp import upload, download, delete
-from io import BytesIO
+from ..dependencies.dependencies import db_dependency, db_read_dependency, async_db_read_dependency, current_user_dependency, current_principal_dependency
+from ..dependencies.pagination import pagination_dependency
+from ..ftp import upload, delete, stream
+from ..executor import run_io
 import uuid
 import os
 import tempfile
@@ -31,7 +34,7 @@ async def add_article(
         if file.content_type not in utils.allowed_image_mime_types:
             raise HTTPException(status_code=403, detail="File harus bertipe image, yaa")
 
-        content = await file.read()
+        content = await utils.read_upload(file)
         file_extension = file.filename.split(".")[-1]
         unique_filename = f"{uuid.uuid4().hex[:5]}.{file_extension}"
        
@@ -48,8 +51,10 @@ async def add_article(
         db.add(new_article)
         db.commit()
         db.refresh(new_article)
-        upload(unique_filename, content, isArticle=True)
+        await run_io(upload, unique_filename, content, isArticle=True)
         return {"message": "Artikel telah ditambahkan!", "status": True}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -57,51 +62,62 @@ async def add_article(
 # Get My Articles
 @router.get("", status_code=status.HTTP_200_OK)
 async def get_my_articles(
-    db: db_dependency, current_user: User = current_user_dependency
+    db: db_read_dependency,
+    pagination: pagination_dependency,
+    current_user: schemas.Principal = current_principal_dependency,
 ):
     if current_user.user_type != 1:
         raise HTTPException(status_code=403, detail="Akun ini tidak diberi ijin!")
 
-    articles = (
-        db.query(ReactionArticle).filter(ReactionArticle.author_id == current_user.user_id).all()
+    query = (
+        db.query(ReactionArticle)
+        .options(pagination.load_only(ReactionArticle, ReactionArticle.updated_at, ReactionArticle.article_id))
+        .filter(ReactionArticle.author_id == current_user.user_id)
     )
-    if not articles:
+    articles = pagination.paginate(query, ReactionArticle.updated_at, ReactionArticle.article_id)
+    if not articles and pagination.cursor is None:
         raise HTTPException(status_code=404, detail="Artikel tidak ditemukan!")
 
-    sorted_articles = sorted(articles, key=lambda x: x.updated_at, reverse=True)
-    return sorted_articles
+    return articles
 
 
 # Get All Approved Article
 @router.get("/approved", status_code=status.HTTP_200_OK)
 async def get_all_approved_articles(
-    db: db_dependency, current_user: User = current_user_dependency
+    db: async_db_read_dependency,
+    pagination: pagination_dependency,
+    current_user: schemas.Principal = current_principal_dependency,
 ):
-    articles = db.query(ReactionArticle).filter(ReactionArticle.approval_status == "APPROVED").all()
-    if not articles:
+    fields, columns = pagination.columns(
+        {
+            "title": ReactionArticle.title,
+            "author_name": User.full_name,
+            "description": ReactionArticle.description,
+            "updated_at": ReactionArticle.updated_at,
+            "article_id": ReactionArticle.article_id,
+        },
+        ReactionArticle.updated_at,
+        ReactionArticle.article_id,
+    )
+    query = (
+        select(*columns)
+        .select_from(ReactionArticle)
+        .join(ReactionArticle.author)
+        .where(ReactionArticle.approval_status == "APPROVED")
+    )
+    articles = await pagination.paginate_async(
+        db, query, ReactionArticle.updated_at, ReactionArticle.article_id
+    )
+    if not articles and pagination.cursor is None:
         raise HTTPException(status_code=404, detail="Artikel tidak ditemukan!")
 
-    approved_articles_schema = []
-
-    for a in articles:
-        user = db.query(User).filter(User.user_id == a.author_id).first()
-        approved_articles_schema.append(schemas.ArticleView(
-            title=a.title,
-            author_name=user.full_name,
-            description=a.description,
-            updated_at=a.updated_at,
-            article_id=a.article_id
-        ))
-
-    articles_sorted = sorted(approved_articles_schema, key=lambda x: x.updated_at, reverse=True)
-    
-    return articles_sorted
+    return pagination.project(articles, fields)
 
 
 # Get Detailed Article
 @router.get("/{articleId}", status_code=status.HTTP_200_OK)
 async def get_article_detail(
-    articleId: int, db: db_dependency, current_user: User = current_user_dependency
+    articleId: int, db: db_read_dependency, current_user: User = current_user_dependency
 ):
     is_valid = False
     if utils.is_valid_Authorization(current_user.email):
@@ -122,14 +138,17 @@ async def get_article_detail(
 
         return {"article_item": article}
     else:
-        article = db.query(ReactionArticle).filter(ReactionArticle.article_id == articleId).first()
+        article = (
+            db.query(ReactionArticle)
+            .options(joinedload(ReactionArticle.author).joinedload(User.teacher))
+            .filter(ReactionArticle.article_id == articleId)
+            .first()
+        )
         if not article:
             raise HTTPException(status_code=404, detail="Artikel tidak ditemukan!")
 
-        user = db.query(User).filter(User.user_id == article.author_id).first()
-        user_nip = (
-            db.query(Teacher).filter(Teacher.teacher_id == user.user_id).first().nip
-        )
+        user = article.author
+        user_nip = user.teacher[0].nip
 
         detail = schemas.ArticleReview(
             article_id=articleId,
@@ -143,7 +162,7 @@ async def get_article_detail(
 
 
 @router.get("/{articleId}/content")
-async def view_content(articleId: int, db: db_dependency):
+async def view_content(articleId: int, db: db_read_dependency):
     article = (
         db.query(ReactionArticle)
         .filter(
@@ -154,9 +173,9 @@ async def view_content(articleId: int, db: db_dependency):
     if not article:
         raise HTTPException(status_code=404, detail="Artikel tidak ditemukan!")
     try:
-        content = download(article.filename, isArticle=True)
+        content = await run_io(stream, article.filename, isArticle=True)
         media_type, _ = mimetypes.guess_type(article.filename)
-        return StreamingResponse(BytesIO(content), media_type=media_type)
+        return StreamingResponse(content, media_type=media_type)
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -188,7 +207,7 @@ async def update_my_article(
     unique_filename = None
     new_article = None
     if file is not None:
-        content = await file.read()
+        content = await utils.read_upload(file)
         file_extension = file.filename.split(".")[-1]
         if file_extension == "":
             raise HTTPException(status_code=400, detail="File tidak valid!")
@@ -214,8 +233,8 @@ async def update_my_article(
     if new_article.description is not None:
         article.description = new_article.description
     if new_article.filename is not None:
-        delete(article.filename, isArticle=True)
-        upload(unique_filename, content, isArticle=True)
+        await run_io(delete, article.filename, isArticle=True)
+        await run_io(upload, unique_filename, content, isArticle=True)
         article.filename = new_article.filename
 
     article.approval_status = "PENDING"
@@ -241,7 +260,7 @@ async def delete_my_article(
 
     db.delete(article)
     db.commit()
-    delete(article.filename, isArticle=True)
+    await run_io(delete, article.filename, isArticle=True)
     return {"message": "Artikel berhasil dihapus!", "status": True}
 
 
@@ -1,13 +1,18 @@
 from fastapi import APIRouter, HTTPException, status
 from datetime import datetime
+from sqlalchemy import select
 from ..schemas import schemas, utils
 from ..models import models
+from ..executor import run_auth
+from ..cache import user_cache
 from ..dependencies.dependencies import (
     db_dependency,
+    async_db_dependency,
     # SECRET_KEY,
     # ALGORITHM,
     # ACCESS_TOKEN_EXPIRE_MINUTES,
     create_access_token,
+    user_token_claims,
     # create_refresh_token
 )
 # from datetime import timedelta
@@ -104,11 +109,9 @@ async def register(
 
 # Login
 @router.post("/login", status_code=status.HTTP_200_OK)
-async def login(user: schemas.UserLogin, db: db_dependency):
-    db_user = (
-        db.query(models.User)
-        .filter(models.User.username == user.username)
-        .first()
+async def login(user: schemas.UserLogin, db: async_db_dependency):
+    db_user = await db.scalar(
+        select(models.User).where(models.User.username == user.username)
     )
 
     if db_user is None:
@@ -116,7 +119,10 @@ async def login(user: schemas.UserLogin, db: db_dependency):
             status_code=400, detail="Nama pengguna atau password salah!"
         )
     
-    if not utils.verify_password(user.password, db_user.password):
+    is_valid, new_hash = await run_auth(
+        utils.verify_and_update_password, user.password, db_user.password
+    )
+    if not is_valid:
         raise HTTPException(
             status_code=400, detail="Nama pengguna atau password salah!"
         )
@@ -124,27 +130,27 @@ async def login(user: schemas.UserLogin, db: db_dependency):
     if db_user.registration_status == "PENDING":
         raise HTTPException(status_code=401, detail="Akun belum di aktivasi!")
 
+    if new_hash is not None:
+        # Stored with a different bcrypt cost; the password is known right now
+        db_user.password = new_hash
+        await db.commit()
+        user_cache.invalidate(db_user.username)
+
     teacher = (
-        db.query(models.Teacher)
-        .filter(models.Teacher.teacher_id == db_user.user_id)
-        .first()
+        await db.get(models.Teacher, db_user.user_id)
         if db_user.user_type == 1
         else None
     )
     student = (
-        db.query(models.Student)
-        .filter(models.Student.student_id == db_user.user_id)
-        .first()
+        await db.get(models.Student, db_user.user_id)
         if db_user.user_type == 0
         else None
     )
     
-    intro_title = db.query(models.PengenalanReaksi).first()
+    intro_title = await db.scalar(select(models.PengenalanReaksi.title).limit(1))
     if intro_title is None:
         intro_title = "Pengenalan Reaksi"
-    else:
-        intro_title = intro_title.title
-    access_token = create_access_token(data={"sub": db_user.username})
+    access_token = create_access_token(data=user_token_claims(db_user))
     # refresh_token = create_refresh_token(data={"sub": db_user.username})
 
     return {
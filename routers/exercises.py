@@ -1,7 +1,10 @@
 from fastapi import APIRouter, HTTPException, status
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
 from ..schemas import schemas, utils
-from ..models.models import Exercise, Question, User, Teacher, StudentExerciseResult
-from ..dependencies.dependencies import db_dependency, current_user_dependency
+from ..models.models import Exercise, Question, User, StudentExerciseResult
+from ..dependencies.dependencies import db_dependency, db_read_dependency, async_db_read_dependency, current_user_dependency, current_principal_dependency
+from ..dependencies.pagination import pagination_dependency
 from datetime import datetime
 
 router = APIRouter()
@@ -48,19 +51,23 @@ async def add_latihan(
 # Get My Exercises
 @router.get("", status_code=status.HTTP_200_OK)
 async def get_my_exercises(
-    db: db_dependency, current_user: User = current_user_dependency
+    db: db_read_dependency,
+    pagination: pagination_dependency,
+    current_user: schemas.Principal = current_principal_dependency,
 ):
     if current_user.user_type != 1:
         raise HTTPException(status_code=403, detail="Akun ini tidak diberi ijin!")
 
-    latihans = (
-        db.query(Exercise).filter(Exercise.author_id == current_user.user_id).all()
+    query = (
+        db.query(Exercise)
+        .options(pagination.load_only(Exercise, Exercise.updated_at, Exercise.exercise_id))
+        .filter(Exercise.author_id == current_user.user_id)
     )
-    if not latihans:
+    latihans = pagination.paginate(query, Exercise.updated_at, Exercise.exercise_id)
+    if not latihans and pagination.cursor is None:
         raise HTTPException(status_code=404, detail="Latihan tidak ditemukan!")
 
-    sorted_exercises = sorted(latihans, key=lambda x: x.updated_at, reverse=True)
-    return sorted_exercises
+    return latihans
 
 
 
@@ -125,65 +132,82 @@ async def update_soal(
     if exercise.author_id != current_user.user_id:
         raise HTTPException(status_code=403, detail="Akun ini tidak diberi ijin!")
     
-    db_soal = db.query(Question).filter(Question.exercise_id == exerciseId)
-
-    new_soal_list = []
-    for new_soal in db_soal.all():
-        for item in soal:
-            if (new_soal.question_id == item.question_id):
-                new_soal.question_text = item.question_text
-                new_soal.answer_keys = item.answer_keys
-                new_soal.option_text = item.option_text
-                db.add(new_soal)
-                new_soal_list.append(new_soal)
+    # Only questions of this exercise may be touched; one UPDATE by
+    # primary key is then sent for all of them as a single executemany.
+    submitted = {item.question_id: item for item in soal}
+    question_ids = db.scalars(
+        select(Question.question_id).where(
+            Question.exercise_id == exerciseId,
+            Question.question_id.in_(submitted),
+        )
+    ).all()
+
+    new_soal_list = [
+        {
+            "question_id": question_id,
+            "question_text": submitted[question_id].question_text,
+            "option_text": submitted[question_id].option_text,
+            "answer_keys": submitted[question_id].answer_keys,
+        }
+        for question_id in question_ids
+    ]
+    if new_soal_list:
+        db.execute(update(Question), new_soal_list)
 
     exercise.updated_at = datetime.now()
     exercise.approval_status = "PENDING"
     db.commit()
 
-    for updated_soal in new_soal_list:
-        db.refresh(updated_soal)
-    return {"message": "Soal berhasil diperbarui!", "status": True}
+    return {"message": "Soal berhasil diperbarui!", "status": True, "data": new_soal_list}
 
 
 
 # Get All Latihan
 @router.get("/approved", status_code=status.HTTP_200_OK)
 async def get_all_approved_exercise(
-    db: db_dependency, current_user: User = current_user_dependency
+    db: async_db_read_dependency,
+    pagination: pagination_dependency,
+    current_user: schemas.Principal = current_principal_dependency,
 ):
-    exercise = db.query(Exercise).filter(Exercise.approval_status == "APPROVED").all()
-    if not exercise:
-        raise HTTPException(status_code=404, detail="Materi tidak ditemukan!")
-
-    exercise_sorted = sorted(exercise, key=lambda x: x.updated_at, reverse=True)
-
-    new_exercise = []
-    for item in exercise_sorted:
-        result = (
-            db.query(StudentExerciseResult)
-            .filter(
-                StudentExerciseResult.exercise_id == item.exercise_id,
-                StudentExerciseResult.student_id == current_user.user_id,
-            )
-            .first()
+    # Hide exercises this student already finished with one anti-join
+    # instead of a result lookup per exercise.
+    is_completed = (
+        select(StudentExerciseResult.result_id)
+        .where(
+            StudentExerciseResult.exercise_id == Exercise.exercise_id,
+            StudentExerciseResult.student_id == current_user.user_id,
+        )
+        .exists()
+    )
+    fields, columns = pagination.columns(
+        {
+            "exercise_id": Exercise.exercise_id,
+            "title": Exercise.title,
+            "difficulty": Exercise.difficulty,
+        },
+        Exercise.updated_at,
+        Exercise.exercise_id,
+    )
+    query = select(*columns).where(Exercise.approval_status == "APPROVED", ~is_completed)
+    exercise = await pagination.paginate_async(db, query, Exercise.updated_at, Exercise.exercise_id)
+
+    if not exercise and pagination.cursor is None:
+        has_approved = await db.scalar(
+            select(Exercise.exercise_id)
+            .where(Exercise.approval_status == "APPROVED")
+            .limit(1)
         )
-        if not result:
-            modified_exercise = {
-                "exercise_id": item.exercise_id,
-                "title": item.title,
-                "difficulty": item.difficulty,
-            }
-            new_exercise.append(modified_exercise)
+        if not has_approved:
+            raise HTTPException(status_code=404, detail="Materi tidak ditemukan!")
 
-    return new_exercise
+    return pagination.json_response(exercise, fields)
 
 
 
 # Get Detail Latihan
 @router.get("/{exerciseId}", status_code=status.HTTP_200_OK)
 async def get_my_detail_latihan(
-    exerciseId: int, db: db_dependency, current_user: User = current_user_dependency
+    exerciseId: int, db: db_read_dependency, current_user: User = current_user_dependency
 ):
     is_valid = False
     if current_user.user_type != 1:
@@ -218,14 +242,17 @@ async def get_my_detail_latihan(
 
         return {"latihan": latihan, "soal": soal, "is_results_exist": is_results_exist}
     else:
-        latihan = db.query(Exercise).filter(Exercise.exercise_id == exerciseId).first()
+        latihan = (
+            db.query(Exercise)
+            .options(joinedload(Exercise.author).joinedload(User.teacher))
+            .filter(Exercise.exercise_id == exerciseId)
+            .first()
+        )
         if not latihan:
             raise HTTPException(status_code=404, detail="Latihan tidak ditemukan!")
 
-        user = db.query(User).filter(User.user_id == latihan.author_id).first()
-        user_nip = (
-            db.query(Teacher).filter(Teacher.teacher_id == user.user_id).first().nip
-        )
+        user = latihan.author
+        user_nip = user.teacher[0].nip
 
         detail = schemas.ExerciseReview(
             exercise_id=exerciseId,
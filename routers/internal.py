@@ -0,0 +1,42 @@
+from fastapi import APIRouter, HTTPException, status
+from ..schemas import utils
+from ..models.models import User
+from ..dependencies.dependencies import current_user_dependency
+from ..cache import content_cache, user_cache, token_versions
+from ..ftp import pool_stats
+from ..executor import executor_stats
+from ..database.database import db_pool_stats
+
+router = APIRouter()
+
+
+# Content Cache Stats
+@router.get("/cache", status_code=status.HTTP_200_OK)
+async def get_cache_stats(current_user: User = current_user_dependency):
+    if not utils.is_valid_Authorization(current_user.email):
+        raise HTTPException(status_code=401, detail="Akun ini tidak diberi ijin!")
+
+    return {
+        "content_cache": content_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "token_versions": token_versions.stats(),
+        "ftp_pools": pool_stats(),
+    }
+
+
+# Executor Stats
+@router.get("/executors", status_code=status.HTTP_200_OK)
+async def get_executor_stats(current_user: User = current_user_dependency):
+    if not utils.is_valid_Authorization(current_user.email):
+        raise HTTPException(status_code=401, detail="Akun ini tidak diberi ijin!")
+
+    return executor_stats()
+
+
+# Database Pool Stats
+@router.get("/db-pool", status_code=status.HTTP_200_OK)
+async def get_db_pool_stats(current_user: User = current_user_dependency):
+    if not utils.is_valid_Authorization(current_user.email):
+        raise HTTPException(status_code=401, detail="Akun ini tidak diberi ijin!")
+
+    return db_pool_stats()
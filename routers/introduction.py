@@ -1,21 +1,21 @@
-from fastapi import APIRouter, HTTPException, status, File, UploadFile, Form
-from fastapi.responses import StreamingResponse
-from ..schemas import utils
+from fastapi import APIRouter, HTTPException, status, File, UploadFile, Form, Header, Response
+from ..schemas import schemas, utils
 from ..models.models import PengenalanReaksi, User
-from ..ftp import upload, download, delete
-from ..dependencies.dependencies import db_dependency, current_user_dependency
-from io import BytesIO
+from ..ftp import delete
+from ..executor import run_io
+from ..jobs import submit_transcode
+from ..dependencies.dependencies import db_dependency, db_read_dependency, current_user_dependency, current_principal_dependency
 import uuid
-import os
-import tempfile
 import mimetypes
 from datetime import datetime
+from typing import Optional
 
 router = APIRouter()
 
 
 @router.post("", status_code=status.HTTP_201_CREATED)
 async def add_test(
+    response: Response,
     db: db_dependency,
     current_user: User = current_user_dependency,
     title: str = Form(...),
@@ -31,47 +31,47 @@ async def add_test(
     file_extension = file.filename.split(".")[-1]
     unique_filename = f"{uuid.uuid4().hex[:5]}.{file_extension}"
 
-    with tempfile.NamedTemporaryFile(
-        delete=False, suffix=f".{file_extension}"
-    ) as input_file:
-        input_file.write(await file.read())
-        input_file_path = input_file.name
-    compressed_file_path = f"{tempfile.gettempdir()}/compressed_{unique_filename}"
+    input_file = await utils.save_upload(file, f".{file_extension}")
 
-    if not utils.check_video_size_limit(input_file_path):
-        raise HTTPException(status_code=400, detail="Ukuran file melebihi batas maksimum 150 MB!")
-
-    utils.compress_video(input_file_path, compressed_file_path)
-    
-    with open(compressed_file_path, "rb") as buffer:
-        content = buffer.read()
-        
     new_introduction = PengenalanReaksi(
         title=title,
         filename=unique_filename,
         description=description,
+        media_status="PROCESSING",
         created_at=datetime.now(),
         updated_at=datetime.now(),
     )
 
-    if upload(unique_filename, content):
-        os.remove(input_file_path)
-        os.remove(compressed_file_path)
-    
     db.add(new_introduction)
     db.commit()
     db.refresh(new_introduction)
 
+    try:
+        job = submit_transcode(
+            "introduction",
+            PengenalanReaksi,
+            new_introduction.intro_id,
+            current_user.user_id,
+            input_file,
+            unique_filename,
+        )
+    except HTTPException:
+        # The transcode queue is full; the client has to upload again
+        db.delete(new_introduction)
+        db.commit()
+        raise
+    response.status_code = status.HTTP_202_ACCEPTED
     return {
-        "message": "Berhasil menambahkan!",
+        "message": "Video sedang diproses!",
         "status": True,
+        "job_id": job.job_id,
     }
 
 
 @router.get("", status_code=status.HTTP_201_CREATED)
 async def get_introduction(
-    db: db_dependency,
-    current_user: User = current_user_dependency,
+    db: db_read_dependency,
+    current_user: schemas.Principal = current_principal_dependency,
 ):
     introduction = db.query(PengenalanReaksi).first()
     if not introduction:
@@ -81,6 +81,7 @@ async def get_introduction(
 
 @router.put("", status_code=status.HTTP_201_CREATED)
 async def update_introduction(
+    response: Response,
     db: db_dependency,
     current_user: User = current_user_dependency,
     title: str = Form(default=None),
@@ -103,21 +104,7 @@ async def update_introduction(
             raise HTTPException(status_code=400, detail="File tidak valid.")
         unique_filename = f"{uuid.uuid4().hex[:5]}.{file_extension}"
 
-        with tempfile.NamedTemporaryFile(
-            delete=False, suffix=f".{file_extension}"
-        ) as input_file:
-            input_file.write(await file.read())
-            input_file_path = input_file.name
-        compressed_file_path = f"{tempfile.gettempdir()}/compressed_{unique_filename}"
-
-        if not utils.check_video_size_limit(input_file_path):
-            raise HTTPException(status_code=400, detail="Ukuran file melebihi batas maksimum 150 MB!")
-
-        utils.compress_video(input_file_path, compressed_file_path)
-        
-        with open(compressed_file_path, "rb") as buffer:
-            content = buffer.read()
-            
+        input_file = await utils.save_upload(file, f".{file_extension}")
 
     if title is not None or unique_filename is not None or description is not None:
         new_intro = PengenalanReaksi(
@@ -136,13 +123,34 @@ async def update_introduction(
         old_intro.description = description
 
     if new_intro.filename is not None:
-        delete(old_intro.filename)
-        upload(unique_filename, content)
-        old_intro.filename = new_intro.filename
+        # The current video keeps being served until the new one is ready
+        old_filename = old_intro.filename
+        previous_media_status = old_intro.media_status
+        old_intro.media_status = "PROCESSING"
 
     old_intro.updated_at = datetime.now()
     db.commit()
     db.refresh(old_intro)
+    if new_intro.filename is not None:
+        # Submitted after the commit, so the job's READY cannot be
+        # overwritten by this request's PROCESSING
+        try:
+            job = submit_transcode(
+                "introduction",
+                PengenalanReaksi,
+                old_intro.intro_id,
+                current_user.user_id,
+                input_file,
+                unique_filename,
+                old_filename=old_filename,
+            )
+        except HTTPException:
+            # The transcode queue is full; the current video stays in place
+            old_intro.media_status = previous_media_status
+            db.commit()
+            raise
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "Video sedang diproses!", "status": True, "job_id": job.job_id}
     return {"message": "Berhasil memperbarui!", "status": True}
 
 
@@ -157,27 +165,45 @@ async def delete_introduction(
     introduction = db.query(PengenalanReaksi).first()
     db.delete(introduction)
     db.commit()
-    delete(introduction.filename)
+    await run_io(delete, introduction.filename)
+    if introduction.thumbnail:
+        await run_io(delete, introduction.thumbnail)
     return {"message": "Berhasil dihapus!", "status": True}
 
 
 @router.get("/content")
-async def view_introduction_content(db: db_dependency):
+async def view_introduction_content(
+    db: db_read_dependency,
+    range_header: Optional[str] = Header(default=None, alias="Range"),
+):
     introduction_content = db.query(PengenalanReaksi).first()
     try:
         media_type, _ = mimetypes.guess_type(introduction_content.filename)
-        content = download(introduction_content.filename)
-        return StreamingResponse(BytesIO(content), media_type=media_type)
+        return await utils.ranged_content_response(
+            introduction_content.filename, range_header, media_type
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
 @router.get("/content/thumbnail")
-async def get_video_thumbnail(db: db_dependency):
+async def get_video_thumbnail(
+    db: db_dependency,
+    if_none_match: Optional[str] = Header(default=None),
+):
     introduction_content = db.query(PengenalanReaksi).first()
     try:
-        content = download(introduction_content.filename)
-        thumbnail = utils.get_thumbnail(content)
-        return StreamingResponse(BytesIO(thumbnail), media_type="image/jpeg")
+        if introduction_content.thumbnail is None:
+            introduction_content.thumbnail = await run_io(
+                utils.backfill_video_thumbnail, introduction_content.filename
+            )
+            db.commit()
+        if introduction_content.thumbnail != utils.NO_THUMBNAIL:
+            return await utils.cached_image_response(
+                introduction_content.thumbnail, if_none_match
+            )
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
+    raise HTTPException(status_code=404, detail="Thumbnail tidak tersedia!")
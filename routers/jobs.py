@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException, status
+from ..schemas import schemas, utils
+from ..models.models import User
+from ..dependencies.dependencies import db_dependency, current_user_dependency
+from ..jobs import get_job
+
+router = APIRouter()
+
+
+# Get Job Status (from the primary: a replica may lag behind the progress)
+@router.get("/{jobId}", status_code=status.HTTP_200_OK, response_model=schemas.JobStatus)
+async def get_job_status(jobId: str, db: db_dependency, current_user: User = current_user_dependency):
+    job = get_job(db, jobId)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan!")
+
+    if job.owner_id != current_user.user_id and not utils.is_valid_Authorization(current_user.email):
+        raise HTTPException(status_code=403, detail="Akun ini tidak diberi ijin!")
+
+    return job
@@ -1,16 +1,19 @@
-from fastapi import APIRouter, HTTPException, status, File, UploadFile, Form
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, status, File, UploadFile, Form, Header, Response
 from ..schemas import schemas
-from ..models.models import Material, User, Teacher
+from ..models.models import Material, User
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
 from ..schemas import utils
-from ..dependencies.dependencies import db_dependency, current_user_dependency
-from ..ftp import upload, download, delete
-from io import BytesIO
+from ..dependencies.dependencies import db_dependency, db_read_dependency, async_db_read_dependency, current_user_dependency, current_principal_dependency
+from ..dependencies.pagination import pagination_dependency
+from ..ftp import upload, delete
+from ..executor import run_io
+from ..jobs import submit_transcode
 import uuid
 import os
-import tempfile
 import mimetypes
 from datetime import datetime
+from typing import Optional
 
 router = APIRouter()
 
@@ -18,6 +21,7 @@ router = APIRouter()
 # Upload Materi
 @router.post("", status_code=status.HTTP_201_CREATED)
 async def add_materi(
+    response: Response,
     db: db_dependency,
     current_user: User = current_user_dependency,
     title: str = Form(...),
@@ -30,32 +34,18 @@ async def add_materi(
             raise HTTPException(status_code=403, detail="Akun ini tidak diberi ijin!")
 
         if media_type != "image":
+            if media_type != "video":
+                raise HTTPException(status_code=400, detail="Tipe file tidak valid!")
+
             file_extension = file.filename.split(".")[-1]
             unique_filename = f"{uuid.uuid4().hex[:5]}.{file_extension}"
 
-            with tempfile.NamedTemporaryFile(
-                delete=False, suffix=f".{file_extension}"
-            ) as input_file:
-                input_file.write(await file.read())
-                input_file_path = input_file.name
-            compressed_file_path = f"{tempfile.gettempdir()}/compressed_{unique_filename}"
-            
-            if not utils.check_video_size_limit(input_file_path):
-                raise HTTPException(status_code=400, detail="Ukuran file melebihi batas maksimum 150 MB!")
-
-            utils.compress_video(input_file_path, compressed_file_path)
-            
-            with open(compressed_file_path, "rb") as buffer:
-                content = buffer.read()
+            input_file = await utils.save_upload(file, f".{file_extension}")
         else:
-            content = await file.read()
+            content = await utils.read_upload(file)
             file_extension = file.filename.split(".")[-1]
             unique_filename = f"{uuid.uuid4().hex[:5]}.{file_extension}"
 
-        if media_type != "image":
-            if media_type != "video":
-                raise HTTPException(status_code=400, detail="Tipe file tidak valid!")
-        
         db_materi = Material(
             title=title,
             media_type=media_type,
@@ -63,6 +53,7 @@ async def add_materi(
             description=description,
             author_id=current_user.user_id,
             approval_status="PENDING",
+            media_status="READY" if media_type == "image" else "PROCESSING",
             created_at=datetime.now(),
             updated_at=datetime.now(),
         )
@@ -70,8 +61,30 @@ async def add_materi(
         db.add(db_materi)
         db.commit()
         db.refresh(db_materi)
-        upload(unique_filename, content, isTeacher=True)
-        return {"message": "Materi telah ditambahkan!", "status": True}
+
+        if media_type == "image":
+            await run_io(upload, unique_filename, content, isTeacher=True)
+            return {"message": "Materi telah ditambahkan!", "status": True}
+
+        try:
+            job = submit_transcode(
+                "material",
+                Material,
+                db_materi.material_id,
+                current_user.user_id,
+                input_file,
+                unique_filename,
+                account={"isTeacher": True},
+            )
+        except HTTPException:
+            # The transcode queue is full; the client has to upload again
+            db.delete(db_materi)
+            db.commit()
+            raise
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "Materi sedang diproses!", "status": True, "job_id": job.job_id}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -79,48 +92,53 @@ async def add_materi(
 # Get My Materi
 @router.get("", status_code=status.HTTP_200_OK)
 async def get_my_materials(
-    db: db_dependency, current_user: User = current_user_dependency
+    db: db_read_dependency,
+    pagination: pagination_dependency,
+    current_user: schemas.Principal = current_principal_dependency,
 ):
     if current_user.user_type != 1:
         raise HTTPException(status_code=403, detail="Akun ini tidak diberi ijin!")
 
-    materials = (
-        db.query(Material).filter(Material.author_id == current_user.user_id).all()
+    query = (
+        db.query(Material)
+        .options(pagination.load_only(Material, Material.updated_at, Material.material_id))
+        .filter(Material.author_id == current_user.user_id)
     )
-    if not materials:
+    materials = pagination.paginate(query, Material.updated_at, Material.material_id)
+    if not materials and pagination.cursor is None:
         raise HTTPException(status_code=404, detail="Materi tidak ditemukan!")
 
-    sorted_materials = sorted(materials, key=lambda x: x.updated_at, reverse=True)
-    return sorted_materials
+    return materials
 
 
 # Get All Approved Materi
 @router.get("/approved", status_code=status.HTTP_200_OK)
 async def get_all_approved_materials(
-    db: db_dependency, current_user: User = current_user_dependency
+    db: async_db_read_dependency,
+    pagination: pagination_dependency,
+    current_user: schemas.Principal = current_principal_dependency,
 ):
-    materials = db.query(Material).filter(Material.approval_status == "APPROVED").all()
-    if not materials:
+    fields, columns = pagination.columns(
+        {
+            "material_id": Material.material_id,
+            "title": Material.title,
+            "description": Material.description,
+        },
+        Material.updated_at,
+        Material.material_id,
+    )
+    query = select(*columns).where(Material.approval_status == "APPROVED")
+    materials = await pagination.paginate_async(db, query, Material.updated_at, Material.material_id)
+    if not materials and pagination.cursor is None:
         raise HTTPException(status_code=404, detail="Materi tidak ditemukan!")
-    
-    material_sorted = sorted(materials, key=lambda x: x.updated_at, reverse=True)
-    
-    new_materials = []
-    for item in material_sorted:
-        modified_material = {
-            "material_id": item.material_id,
-            "title": item.title,
-            "description": item.description
-        }
-        new_materials.append(modified_material)
 
-    return new_materials
+    return pagination.json_response(materials, fields)
 
 
 # Get Detailed Materi
 @router.get("/{materialId}", status_code=status.HTTP_200_OK)
 async def get_materi_detail(
-    materialId: int, db: db_dependency, current_user: User = current_user_dependency
+    materialId: int, db: db_read_dependency, current_user: User = current_user_dependency
 ):
     is_valid = False
     if utils.is_valid_Authorization(current_user.email):
@@ -141,14 +159,17 @@ async def get_materi_detail(
 
         return {"materi_item": material}
     else:
-        materi = db.query(Material).filter(Material.material_id == materialId).first()
+        materi = (
+            db.query(Material)
+            .options(joinedload(Material.author).joinedload(User.teacher))
+            .filter(Material.material_id == materialId)
+            .first()
+        )
         if not materi:
             raise HTTPException(status_code=404, detail="Materi tidak ditemukan!")
 
-        user = db.query(User).filter(User.user_id == materi.author_id).first()
-        user_nip = (
-            db.query(Teacher).filter(Teacher.teacher_id == user.user_id).first().nip
-        )
+        user = materi.author
+        user_nip = user.teacher[0].nip
 
         detail = schemas.MaterialReview(
             material_id=materialId,
@@ -163,7 +184,11 @@ async def get_materi_detail(
 
 
 @router.get("/{materialId}/content")
-async def view_content(materialId: int, db: db_dependency):
+async def view_content(
+    materialId: int,
+    db: db_read_dependency,
+    range_header: Optional[str] = Header(default=None, alias="Range"),
+):
     material = (
         db.query(Material)
         .filter(
@@ -172,9 +197,12 @@ async def view_content(materialId: int, db: db_dependency):
         .first()
     )
     try:
-        content = download(material.filename, isTeacher=True)
         media_type, _ = mimetypes.guess_type(material.filename)
-        return StreamingResponse(BytesIO(content), media_type=media_type)
+        return await utils.ranged_content_response(
+            material.filename, range_header, media_type, isTeacher=True
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -183,6 +211,7 @@ async def view_content(materialId: int, db: db_dependency):
 @router.put("/{materialId}", status_code=status.HTTP_200_OK)
 async def update_my_materi(
     materialId: int,
+    response: Response,
     db: db_dependency,
     current_user: User = current_user_dependency,
     title: str = Form(default=None),
@@ -205,7 +234,7 @@ async def update_my_materi(
     db_materi = None
     if file is not None:
         if media_type == "image":
-            content = await file.read()
+            content = await utils.read_upload(file)
             file_extension = file.filename.split(".")[-1]
             if file_extension == "":
                 raise HTTPException(status_code=400, detail="File tidak valid!")
@@ -214,20 +243,7 @@ async def update_my_materi(
             file_extension = file.filename.split(".")[-1]
             unique_filename = f"{uuid.uuid4().hex[:5]}.{file_extension}"
 
-            with tempfile.NamedTemporaryFile(
-                delete=False, suffix=f".{file_extension}"
-            ) as input_file:
-                input_file.write(await file.read())
-                input_file_path = input_file.name
-            compressed_file_path = f"{tempfile.gettempdir()}/compressed_{unique_filename}"
-
-            if not utils.check_video_size_limit(input_file_path):
-                raise HTTPException(status_code=400, detail="Ukuran file melebihi batas maksimum 150 MB!")
-            
-            utils.compress_video(input_file_path, compressed_file_path)
-
-            with open(compressed_file_path, "rb") as buffer:
-                content = buffer.read()
+            input_file = await utils.save_upload(file, f".{file_extension}")
 
     if (
         title is not None
@@ -251,19 +267,52 @@ async def update_my_materi(
         raise HTTPException(status_code=403, detail="Anda harus menyertakan file!")
     if db_materi.description is not None:
         material.description = db_materi.description
+    transcode = False
     if db_materi.filename is not None:
         if db_materi.media_type is None:
             raise HTTPException(
                 status_code=400, detail="Anda tidak menyertakan tipe file!"
             )
-        delete(material.filename, isTeacher=True)
-        upload(unique_filename, content, isTeacher=True)
-        material.filename = db_materi.filename
-        material.media_type = db_materi.media_type
+        if db_materi.media_type == "image":
+            await run_io(delete, material.filename, isTeacher=True)
+            if material.thumbnail:
+                await run_io(delete, material.thumbnail, isTeacher=True)
+            await run_io(upload, unique_filename, content, isTeacher=True)
+            material.filename = db_materi.filename
+            material.thumbnail = None
+            material.media_type = db_materi.media_type
+        else:
+            # The current file keeps being served until the new one is ready
+            transcode = True
+            old_filename = material.filename
+            previous_media_status = material.media_status
+            material.media_status = "PROCESSING"
 
     material.approval_status = "PENDING"
     material.updated_at = datetime.now()
     db.commit()
+    if transcode:
+        # Submitted after the commit, so the job's READY cannot be
+        # overwritten by this request's PROCESSING
+        try:
+            job = submit_transcode(
+                "material",
+                Material,
+                material.material_id,
+                current_user.user_id,
+                input_file,
+                unique_filename,
+                account={"isTeacher": True},
+                values={"media_type": db_materi.media_type},
+                old_filename=old_filename,
+            )
+        except HTTPException:
+            # The transcode queue is full; the current file stays in place
+            material.media_status = previous_media_status
+            db.commit()
+            raise
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "Materi sedang diproses!", "status": True, "job_id": job.job_id}
     return {"message": "Materi telah diperbarui!", "status": True}
 
 
@@ -284,7 +333,9 @@ async def delete_my_materi(
 
     db.delete(material)
     db.commit()
-    delete(material.filename, True)
+    await run_io(delete, material.filename, True)
+    if material.thumbnail:
+        await run_io(delete, material.thumbnail, True)
     return {"message": "Materi berhasil dihapus!", "status": True}
 
 
@@ -325,11 +376,22 @@ async def modify_material_status(
         raise HTTPException(status_code=400, detail="Status tidak valid!")
 
 @router.get("/{materialId}/content/thumbnail")
-async def get_video_thumbnail(materialId: int, db: db_dependency):
+async def get_video_thumbnail(
+    materialId: int,
+    db: db_dependency,
+    if_none_match: Optional[str] = Header(default=None),
+):
     materi_content = db.query(Material).filter(Material.material_id == materialId).first()
     try:
-        content = download(materi_content.filename, isTeacher=True)
-        thumbnail = utils.get_thumbnail(content)
-        return StreamingResponse(BytesIO(thumbnail), media_type="image/jpeg")
+        if materi_content.thumbnail is None:
+            materi_content.thumbnail = await run_io(
+                utils.backfill_video_thumbnail, materi_content.filename, isTeacher=True
+            )
+            db.commit()
+        if materi_content.thumbnail != utils.NO_THUMBNAIL:
+            return await utils.cached_image_response(
+                materi_content.thumbnail, if_none_match, isTeacher=True
+            )
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
+    raise HTTPException(status_code=404, detail="Thumbnail tidak tersedia!")
@@ -1,13 +1,16 @@
 from fastapi import APIRouter, HTTPException, status
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager
 from ..schemas import schemas
 from ..models.models import (
     StudentAnswer,
     StudentExerciseResult,
     Question,
     Exercise,
-    User,
 )
-from ..dependencies.dependencies import db_dependency, current_user_dependency
+from ..dependencies.dependencies import db_dependency, db_read_dependency, async_db_read_dependency, current_principal_dependency
+from ..dependencies.pagination import pagination_dependency
 from datetime import datetime
 from ..schemas import utils
 
@@ -20,7 +23,7 @@ async def submit_student_answers(
     exerciseId: int,
     request: schemas.SubmitExerciseRequest,
     db: db_dependency,
-    current_user: User = current_user_dependency,
+    current_user: schemas.Principal = current_principal_dependency,
 ):
     if current_user.user_type != 0:
         raise HTTPException(status_code=403, detail="Akun ini tidak diberi ijin!")
@@ -44,44 +47,33 @@ async def submit_student_answers(
     if not exercise:
         raise HTTPException(status_code=404, detail="Latihan tidak ditemukan!")
 
-    questions = db.query(Question).filter(Question.exercise_id == exerciseId).all()
+    questions = {
+        question.question_id: question
+        for question in db.query(Question).filter(Question.exercise_id == exerciseId)
+    }
+    if not questions:
+        raise HTTPException(status_code=404, detail="Soal tidak ditemukan!")
 
     # Calculate the score
     total_score = 0
-    answer_results = []
+    graded_answers = []
     for answer in request.answers:
-        question = next(
-            (q for q in questions if q.question_id == answer.question_id), None
-        )
+        question = questions.get(answer.question_id)
         if question:
-            selected_keys = answer.selected_option
-            correct_keys = question.answer_keys
-
-            if correct_keys == selected_keys:
+            is_correct = question.answer_keys == answer.selected_option
+            if is_correct:
                 total_score += 1  # Full score for correct answer
-                answer_results.append(
-                    schemas.AnswerResult(
-                        question_id=question.question_id,
-                        question_title=question.question_text,
-                        selected_option=selected_keys,
-                        correct_option=correct_keys,
-                        correct=True,
-                    )
-                )
-            else:
-                answer_results.append(
-                    schemas.AnswerResult(
-                        question_id=question.question_id,
-                        question_title=question.question_text,
-                        selected_option=selected_keys,
-                        correct_option=correct_keys,
-                        correct=False,
-                    )
-                )
+            graded_answers.append(
+                {
+                    "question_id": answer.question_id,
+                    "selected_option": answer.selected_option,
+                    "is_correct": is_correct,
+                }
+            )
 
     score_percentage = round((total_score / len(questions)) * 100, 2)
 
-    # Save the result
+    # Save the result and its answers in one transaction
     result = StudentExerciseResult(
         student_id=current_user.user_id,
         exercise_id=exerciseId,
@@ -89,27 +81,27 @@ async def submit_student_answers(
         completion_date=datetime.now(),
     )
     db.add(result)
-    db.commit()
-    db.refresh(result)
-
-    # Save the student answers
-    for answer in request.answers:
-        for is_correct in answer_results:
-            if answer.question_id == is_correct.question_id:
-                student_answer = StudentAnswer(
-                    result_id=result.result_id,
-                    question_id=answer.question_id,
-                    selected_option=answer.selected_option,
-                    is_correct=is_correct.correct,
-                )
-                db.add(student_answer)
+    try:
+        db.flush()
+    except IntegrityError:
+        # A concurrent submission for the same exercise got in first
+        db.rollback()
+        raise HTTPException(
+            status_code=403, detail="Anda sudah menyelesaikan latihan ini!"
+        )
 
+    result_id = result.result_id
+    if graded_answers:
+        db.execute(
+            insert(StudentAnswer),
+            [{"result_id": result_id, **answer} for answer in graded_answers],
+        )
     db.commit()
 
     return {
         "message": "Latihan berhasil diselesaikan!",
         "status": True,
-        "data": result.result_id,
+        "data": result_id,
     }
 
 
@@ -117,21 +109,23 @@ async def submit_student_answers(
 @router.get("/exercises/{exerciseId}/practice", status_code=status.HTTP_200_OK)
 async def get_soal_for_practice(
     exerciseId: int,
-    db: db_dependency,
-    current_user: User = current_user_dependency,
+    db: async_db_read_dependency,
+    current_user: schemas.Principal = current_principal_dependency,
 ):
     if current_user.user_type != 0:
         raise HTTPException(status_code=403, detail="Akun ini tidak diberi ijin!")
 
-    latihan_check = (
-        db.query(Exercise).filter(Exercise.exercise_id == exerciseId).first()
+    approval_status = await db.scalar(
+        select(Exercise.approval_status).where(Exercise.exercise_id == exerciseId)
     )
-    if latihan_check.approval_status != "APPROVED":
+    if approval_status != "APPROVED":
         raise HTTPException(
             status_code=403, detail="Latihan ini tidak memenuhi kriteria!"
         )
 
-    soals = db.query(Question).filter(Question.exercise_id == exerciseId).all()
+    soals = (
+        await db.scalars(select(Question).where(Question.exercise_id == exerciseId))
+    ).all()
 
     if not soals:
         raise HTTPException(status_code=404, detail="Soal tidak ditemukan!")
@@ -154,69 +148,76 @@ async def get_soal_for_practice(
 # Get Student Result
 @router.get("/results", status_code=status.HTTP_200_OK)
 async def get_my_results(
-    db: db_dependency, current_user: User = current_user_dependency
+    db: db_read_dependency,
+    pagination: pagination_dependency,
+    current_user: schemas.Principal = current_principal_dependency,
 ):
-    results = (
-        db.query(StudentExerciseResult)
-        .filter(StudentExerciseResult.student_id == current_user.user_id).all()
+    fields, columns = pagination.columns(
+        {
+            "result_id": StudentExerciseResult.result_id,
+            "title": Exercise.title,
+            "difficulty": Exercise.difficulty,
+            "score": StudentExerciseResult.score,
+        },
+        StudentExerciseResult.completion_date,
+        StudentExerciseResult.result_id,
     )
-    if not results:
+    query = (
+        db.query(*columns)
+        .select_from(StudentExerciseResult)
+        .join(StudentExerciseResult.exercise)
+        .filter(StudentExerciseResult.student_id == current_user.user_id)
+    )
+    results = pagination.paginate(
+        query, StudentExerciseResult.completion_date, StudentExerciseResult.result_id
+    )
+
+    if not results and pagination.cursor is None:
         raise HTTPException(status_code=404, detail="Hasil tidak ditemukan!")
-        
-    sorted_results = sorted(results, key=lambda x: x.completion_date, reverse=True)
-    
-    new_results = []
-    for result in sorted_results:
-        exercise = db.query(Exercise).filter(Exercise.exercise_id == result.exercise_id).first()
-        new_results.append(
-            schemas.StudentResult(
-                result_id=result.result_id,
-                title=exercise.title,
-                difficulty=exercise.difficulty,
-                score=result.score,
-            )
-        )
 
-    return new_results
+    return pagination.project(results, fields)
 
 
 # Get Student Answers
 @router.get("/results/{resultId}", status_code=status.HTTP_200_OK)
 async def get_my_result_detail(
-    resultId: int, db: db_dependency, current_user: User = current_user_dependency
+    resultId: int, db: db_read_dependency, current_user: schemas.Principal = current_principal_dependency
 ):
-    results = (
+    # One joined query; .first() would LIMIT the joined answer rows too
+    rows = (
         db.query(StudentExerciseResult)
+        .outerjoin(StudentExerciseResult.answers)
+        .outerjoin(StudentAnswer.question)
+        .options(
+            contains_eager(StudentExerciseResult.answers).contains_eager(StudentAnswer.question)
+        )
         .filter(
             StudentExerciseResult.result_id == resultId,
         )
-        .first()
+        .order_by(StudentAnswer.answer_id)
+        .all()
     )
+    results = rows[0] if rows else None
     if not results:
         raise HTTPException(status_code=404, detail="Hasil tidak ditemukan!")
     
     if results.student_id != current_user.user_id:
         raise HTTPException(status_code=403, detail="Anda tidak diberi ijin!")
     
-    answers = (
-        db.query(StudentAnswer)
-        .filter(StudentAnswer.result_id == results.result_id)
-        .all()
-    )
+    answers = results.answers
     
     if not answers:
         raise HTTPException(status_code=404, detail="Jawaban tidak ditemukan!")
 
     answer_results = []
     for answer in answers:
-        question = db.query(Question).filter(Question.question_id == answer.question_id).first()
         answer_results.append(
             schemas.AnswerResult(
                 question_id=answer.question_id,
-                question_title=question.question_text,
+                question_title=answer.question.question_text,
                 selected_option=answer.selected_option,
-                correct_option=question.answer_keys,
+                correct_option=answer.question.answer_keys,
                 correct=answer.is_correct,
             )
         )
-    return schemas.StudentResultDetail(answers_results=answer_results, score=results.score)
\ No newline at end of file
+    return schemas.StudentResultDetail(answers_results=answer_results, score=results.score)
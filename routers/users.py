@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException, status, File, UploadFile, Form
-from fastapi.responses import StreamingResponse
-from io import BytesIO
+from fastapi import APIRouter, HTTPException, status, File, UploadFile, Form, Header, Response
 from ..schemas import schemas, utils
-from ..models.models import User, Teacher, Student, Material, Exercise, ReactionArticle
-from ..dependencies.dependencies import db_dependency, current_user_dependency
+from ..models.models import User, Teacher, Student
+from ..dependencies.dependencies import db_dependency, db_read_dependency, current_user_dependency, note_token_version
+from ..dependencies.pagination import pagination_dependency
 from ..ftp import upload, download, delete
+from ..cache import user_cache
+from ..executor import run_io, run_cpu, run_auth
 from datetime import datetime
+from typing import Optional
+from ftplib import error_perm
 import uuid
+import json
 
 
 router = APIRouter()
@@ -15,41 +19,44 @@ router = APIRouter()
 # Get Pending Users
 @router.get("/pending", status_code=status.HTTP_200_OK)
 async def get_pending_user(
-    db: db_dependency, current_user: User = current_user_dependency
+    db: db_read_dependency,
+    pagination: pagination_dependency,
+    current_user: User = current_user_dependency,
 ):
 
     if not utils.is_valid_Authorization(current_user.email):
         raise HTTPException(status_code=401, detail="Akun ini tidak diberi ijin!")
 
+    fields, columns = pagination.columns(
+        {
+            "user_id": User.user_id,
+            "username": User.username,
+            "nip": Teacher.nip,
+            "nisn": Student.nisn,
+        },
+        User.updated_at,
+        User.user_id,
+    )
     query = (
-        db.query(User, Teacher.nip, Student.nisn)
+        db.query(*columns)
+        .select_from(User)
         .outerjoin(Teacher, Teacher.teacher_id == User.user_id)
         .outerjoin(Student, Student.student_id == User.user_id)
         .filter(User.registration_status == "PENDING")
     )
 
-    results = query.all()
+    results = pagination.paginate(query, User.updated_at, User.user_id)
 
-    if not results:
+    if not results and pagination.cursor is None:
         raise HTTPException(status_code=404, detail="Pengguna tidak ditemukan!")
 
-    combined_users = []
-    for user, nip, nisn in results:
-        combined_user = schemas.CombinedUser(
-            username=user.username,
-            user_id=user.user_id,
-            nip=nip,
-            nisn=nisn,
-        )
-        combined_users.append(combined_user)
-
-    return combined_users
+    return pagination.project(results, fields)
 
 
 # Get Detailed User
 @router.get("/{userId}", status_code=status.HTTP_200_OK)
 async def get_user_by_id(
-    userId: int, db: db_dependency, current_user: User = current_user_dependency
+    userId: int, db: db_read_dependency, current_user: User = current_user_dependency
 ):
     if current_user.user_id != userId:
         if not utils.is_valid_Authorization(current_user.email):
@@ -89,10 +96,14 @@ async def approve_user_registration(
         raise HTTPException(status_code=404, detail="Pengguna tidak ditemukan!")
 
     user.registration_status = "APPROVED"
-    user.password = utils.hash_password(password)
+    user.password = await run_auth(utils.hash_password, password)
+    user.token_version += 1
     user.updated_at = datetime.now()
-    utils.send_email(name=user.full_name, client_email=user.email, password=password, is_approved=True)
+    await run_io(utils.send_email, name=user.full_name, client_email=user.email, password=password, is_approved=True)
+    username, token_version = user.username, user.token_version
     db.commit()
+    user_cache.invalidate(username)
+    note_token_version(userId, token_version)
     return {"message": "Anda berhasil menerima akun ini!", "status": True}
 
 
@@ -113,7 +124,7 @@ async def reject_user_registration(
             status_code=403, detail="Tidak dapat menolak, Akun ini sudah di aktivasi!"
         )
 
-    utils.send_email(name=user.full_name, client_email=user.email, password="", is_approved=False)
+    await run_io(utils.send_email, name=user.full_name, client_email=user.email, password="", is_approved=False)
 
     if user.user_type == 0:
         student = db.query(Student).filter(Student.student_id == user.user_id).first()
@@ -121,6 +132,7 @@ async def reject_user_registration(
             db.delete(student)
         db.delete(user)
         db.commit()
+        user_cache.invalidate(user.username)
         return {"message": "Anda berhasil menolak akun ini!", "status": True}
     else:
         teacher = db.query(Teacher).filter(Teacher.teacher_id == user.user_id).first()
@@ -128,6 +140,7 @@ async def reject_user_registration(
             db.delete(teacher)
         db.delete(user)
         db.commit()
+        user_cache.invalidate(user.username)
         return {"message": "Anda berhasil menolak akun ini!", "status": True}
 
 
@@ -147,7 +160,7 @@ async def edit_profile_user(
         if file.content_type not in utils.allowed_image_mime_types:
             raise HTTPException(status_code=403, detail="File harus bertipe image, yaa")
         
-        content = await file.read()
+        content = await utils.read_upload(file)
         file_extension = file.filename.split(".")[-1]
         if file_extension == "":
             raise HTTPException(status_code=400, detail="File tidak valid!")
@@ -164,7 +177,7 @@ async def edit_profile_user(
         raise HTTPException(status_code=404, detail="Pengguna tidak ditemukan!")
     if is_email_exist:
         raise HTTPException(status_code=403, detail="Email sudah digunakan!")
-    if not utils.verify_password(old_password, user_query.password):
+    if not await run_auth(utils.verify_password, old_password, user_query.password):
         raise HTTPException(status_code=403, detail="Password anda salah!")
 
     if new_password is None and new_email is None and unique_filename is None:
@@ -172,105 +185,117 @@ async def edit_profile_user(
             status_code=400, detail="Tidak ada data yang diperbarui!"
         )
     if new_password is not None:
-        user_query.password = utils.hash_password(new_password)
+        user_query.password = await run_auth(utils.hash_password, new_password)
 
     if new_email is not None:
         user_query.email = new_email
 
+    if new_password is not None or new_email is not None:
+        user_query.token_version += 1
+
     if unique_filename is not None:
-        upload(unique_filename, content, isPfp=True)
+        try:
+            variants = await run_cpu(utils.make_avatar_variants, content)
+        except Exception:
+            raise HTTPException(status_code=400, detail="File tidak valid!")
+        await run_io(upload, unique_filename, content, isPfp=True)
+        for size, variant in variants.items():
+            await run_io(upload, utils.avatar_filename(unique_filename, size), variant, isPfp=True)
+        if user_query.profile_picture:
+            old_files = [user_query.profile_picture] + [
+                utils.avatar_filename(user_query.profile_picture, size)
+                for size in utils.AVATAR_SIZES
+            ]
+            for old_file in old_files:
+                try:
+                    await run_io(delete, old_file, isPfp=True)
+                except error_perm:
+                    pass
         user_query.profile_picture = unique_filename
 
     user_query.updated_at = datetime.now()
+    username, token_version = user_query.username, user_query.token_version
     db.commit()
+    user_cache.invalidate(username)
+    note_token_version(userId, token_version)
     return {"message": "Profil Anda berhasil diperbarui!", "status": True}
 
 
 # Get All Materi and All exercise
 @router.get("/{teacherId}/posts", status_code=status.HTTP_200_OK)
 async def get_recent_posts(
-    teacherId: int, db: db_dependency, current_user: User = current_user_dependency
+    teacherId: int,
+    db: db_read_dependency,
+    pagination: pagination_dependency,
+    current_user: User = current_user_dependency,
+    approval_status: Optional[str] = None,
 ):
 
     if current_user.user_id != teacherId:
         if not utils.is_valid_Authorization(current_user.email):
             raise HTTPException(status_code=401, detail="Akun ini tidak diberi ijin!")
 
-    article = (
-        db.query(ReactionArticle)
-        .filter(ReactionArticle.author_id == teacherId)
-        .order_by(ReactionArticle.updated_at.desc())
-        .all()
-    )
-
-    materi = (
-        db.query(Material)
-        .filter(Material.author_id == teacherId)
-        .order_by(Material.updated_at.desc())
-        .all()
-    )
-    latihan = (
-        db.query(Exercise)
-        .filter(Exercise.author_id == teacherId)
-        .order_by(Exercise.updated_at.desc())
-        .all()
-    )
-
-    recent_posts = utils.get_recent_posts(article, materi, latihan)
+    if approval_status is not None and approval_status not in ("PENDING", "APPROVED", "REJECTED", "DRAFT"):
+        raise HTTPException(status_code=400, detail="Status tidak valid!")
 
-    return recent_posts
+    rows = pagination.paginate_posts(db, utils.recent_posts(teacherId, approval_status))
+    return [schemas.RecentPostData(**row._mapping) for row in rows]
 
 
 # Get All Pending Materi and All Pending exercise
 @router.get("/posts/pending", status_code=status.HTTP_200_OK)
 async def get_pending_posts(
-    db: db_dependency, current_user: User = current_user_dependency
+    response: Response,
+    db: db_read_dependency,
+    pagination: pagination_dependency,
+    current_user: User = current_user_dependency,
 ):
 
     if not utils.is_valid_Authorization(current_user.email):
         raise HTTPException(status_code=401, detail="Akun ini tidak diberi ijin!")
 
-    article = (
-        db.query(ReactionArticle)
-        .filter(ReactionArticle.approval_status == "PENDING")
-        .order_by(ReactionArticle.updated_at.desc())
-        .all()
-    )
-
-    materi = (
-        db.query(Material)
-        .filter(Material.approval_status == "PENDING")
-        .order_by(Material.updated_at.desc())
-        .all()
-    )
-    latihan = (
-        db.query(Exercise)
-        .filter(Exercise.approval_status == "PENDING")
-        .order_by(Exercise.updated_at.desc())
-        .all()
-    )
-
-    if not article and not materi and not latihan:
+    counts = utils.get_pending_counts(db)
+    if not any(counts.values()):
         raise HTTPException(status_code=404, detail="Tidak ada postingan!")
 
-    pending_posts = utils.get_pending_posts(article, materi, latihan, db)
+    # The review queue shows more rows per page than the other lists
+    pagination.default_limit(100)
+    rows = pagination.paginate_posts(db, utils.pending_posts())
 
-    return pending_posts
+    response.headers["X-Pending-Counts"] = json.dumps(counts)
+    return [schemas.PendingPostData(**row._mapping) for row in rows]
 
 
 # Get User's Profile Picture
 @router.get("/{userId}/pfp", status_code=status.HTTP_200_OK)
 async def get_user_profile_picture(
     userId: int,
-    db: db_dependency
+    db: db_read_dependency,
+    size: int = max(utils.AVATAR_SIZES),
+    if_none_match: Optional[str] = Header(default=None),
 ):
+    if size not in utils.AVATAR_SIZES:
+        raise HTTPException(status_code=400, detail="Ukuran tidak valid!")
+
     user = db.query(User).filter(User.user_id == userId).first()
     if not user:
         raise HTTPException(status_code=404, detail="Pengguna tidak ditemukan!")
     
     try:
-        content = download(user.profile_picture, isPfp=True)
-        thumbnail = utils.get_thumbnail(content)
-        return StreamingResponse(BytesIO(thumbnail), media_type="image/jpeg")
+        variant = utils.avatar_filename(user.profile_picture, size)
+        try:
+            return await utils.cached_image_response(variant, if_none_match, isPfp=True)
+        except error_perm:
+            # Uploaded before variants existed, generate them once
+            content = await run_io(download, user.profile_picture, isPfp=True)
+            variants = await run_cpu(utils.make_avatar_variants, content)
+            for variant_size, variant_content in variants.items():
+                await run_io(
+                    upload,
+                    utils.avatar_filename(user.profile_picture, variant_size),
+                    variant_content,
+                    isPfp=True,
+                )
+            return await utils.cached_image_response(variant, if_none_match, isPfp=True)
     except Exception as e:
-        raise HTTPException(status_code=404, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=404, detail=str(e))
@@ -48,8 +48,30 @@ class ArticleView(BaseModel):
     updated_at: datetime
     article_id: int
 
+class JobStatus(BaseModel):
+    job_id: str
+    kind: str
+    target_id: int
+    status: str
+    progress: Optional[float] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
 class TokenData(BaseModel):
     username: Optional[str] = None
+    token_id: Optional[str] = None
+    user_id: Optional[int] = None
+    user_type: Optional[int] = None
+    token_version: Optional[int] = None
+
+class Principal(BaseModel):
+    user_id: int
+    username: str
+    user_type: int
 
 class UserBase(BaseModel):
     full_name: str
@@ -1,20 +1,36 @@
-from fastapi import Form
+from fastapi import Form, UploadFile
 from passlib.context import CryptContext
-from typing import List
+from typing import Callable, List, Optional, Tuple
 from ..schemas import schemas
 from ..models.models import Material, Exercise, User, ReactionArticle
 from ..dependencies.dependencies import db_dependency
+from sqlalchemy import select, union_all, literal, func, and_, or_
 import os, dotenv
+import base64
+import json
+from datetime import datetime
 from io import BytesIO
-from PIL import Image
+from PIL import Image, ImageOps
 from fastapi import HTTPException
+from fastapi.responses import StreamingResponse, Response
+from ..ftp import stream, size, upload
+from ..executor import run_io
+from ftplib import error_perm
 import cv2
 import tempfile
 import smtplib
 from email.message import EmailMessage
 
 dotenv.load_dotenv()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor; hashes stored with any other cost are redone on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 allowed_image_mime_types = {
         "image/jpeg", "image/png", "image/gif", "image/jpg", "image/webp", "image/avif"
     }
@@ -23,6 +39,22 @@ allowed_video_mime_types = {
 }
 
 VIDEO_MAX_SIZE = 150 * 1024 * 1024
+IMAGE_MAX_SIZE = int(os.getenv("IMAGE_MAX_SIZE", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+AVATAR_SIZES = (64, 128, 256)
+# Image URLs stay the same when the file behind them changes, so clients
+# revalidate with the ETag (the stored filename) once max-age runs out.
+IMAGE_MAX_AGE = int(os.getenv("IMAGE_MAX_AGE", "3600"))
+
+def encode_cursor(*values) -> str:
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor tidak valid!")
 
 def is_valid_Authorization(authorization: str) -> bool:
     return authorization == os.getenv("AUTHORIZATION")
@@ -33,113 +65,91 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_recent_posts(
-    article: List[ReactionArticle], materi: List[Material], latihan: List[Exercise]
-) -> List[schemas.RecentPostData]:
-    recent_posts = []
-
-    for a in article:
-        recent_posts.append(
-            schemas.RecentPostData(
-                title=a.title,
-                description=a.description,
-                approval_status=a.approval_status,
-                updated_at=a.updated_at,
-                post_type="Artikel",
-                post_id=a.article_id
-            )
-        )
-
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    # The new hash is only returned when the stored one uses another cost
+    return pwd_context.verify_and_update(plain_password, hashed_password)
 
-    for m in materi:
-        recent_posts.append(
-            schemas.RecentPostData(
-                title=m.title,
-                description=m.description,
-                approval_status=m.approval_status,
-                updated_at=m.updated_at,
-                post_type="Materi",
-                post_id=m.material_id
-            )
-        )
+def keyset_before(columns: list, values: list):
+    # Rows strictly after the cursor in (col1 DESC, col2 DESC, ...) order
+    condition = columns[-1] < values[-1]
+    for column, value in zip(reversed(columns[:-1]), reversed(values[:-1])):
+        condition = or_(column < value, and_(column == value, condition))
+    return condition
 
-    for l in latihan:
-        recent_posts.append(
-            schemas.RecentPostData(
-                title=l.title,
-                description=l.difficulty,
-                approval_status=l.approval_status,
-                updated_at=l.updated_at,
-                post_type="Latihan",
-                post_id=l.exercise_id
+def pending_posts():
+    # One subquery over every post table, paged with Pagination.paginate_posts
+    def pending(model, post_id, post_type: str):
+        return (
+            select(
+                post_id.label("post_id"),
+                literal(post_type).label("post_type"),
+                model.updated_at.label("updated_at"),
+                User.username.label("author_username"),
             )
+            .join(User, User.user_id == model.author_id)
+            .where(model.approval_status == "PENDING")
         )
 
-    # Sort the recent_posts by created_at in descending order
-    sorted_recent_posts = sorted(recent_posts, key=lambda x: x.updated_at, reverse=True)
-
-    return sorted_recent_posts
+    return union_all(
+        pending(ReactionArticle, ReactionArticle.article_id, "Artikel"),
+        pending(Material, Material.material_id, "Materi"),
+        pending(Exercise, Exercise.exercise_id, "Latihan"),
+    ).subquery()
 
-def get_pending_posts(
-    article: List[ReactionArticle], materi: List[Material], latihan: List[Exercise], db: db_dependency
-) -> List[schemas.PendingPostData]:
-    pending_posts = []
+def get_pending_counts(db: db_dependency) -> dict:
+    def count(model, post_type: str):
+        return select(
+            literal(post_type).label("post_type"), func.count().label("total")
+        ).where(model.approval_status == "PENDING")
 
-    for a in article:
-        username = db.query(User).filter(User.user_id == a.author_id).first().username
-        pending_posts.append(
-            schemas.PendingPostData(
-                author_username=username,
-                post_id=a.article_id,
-                post_type="Artikel",
-                updated_at=a.updated_at
-            )
+    rows = db.execute(
+        union_all(
+            count(ReactionArticle, "Artikel"),
+            count(Material, "Materi"),
+            count(Exercise, "Latihan"),
         )
+    ).all()
+    return {row.post_type: row.total for row in rows}
 
-    for m in materi:
-        username = db.query(User).filter(User.user_id == m.author_id).first().username
-        pending_posts.append(
-            schemas.PendingPostData(
-                author_username=username,
-                post_id=m.material_id,
-                post_type="Materi",
-                updated_at=m.updated_at
-            )
-        )
+def recent_posts(author_id: int, approval_status: Optional[str] = None):
+    # One subquery over every post table, paged with Pagination.paginate_posts
+    def recent(model, post_id, description, post_type: str):
+        query = select(
+            model.title.label("title"),
+            description.label("description"),
+            model.approval_status.label("approval_status"),
+            model.updated_at.label("updated_at"),
+            literal(post_type).label("post_type"),
+            post_id.label("post_id"),
+        ).where(model.author_id == author_id)
+        if approval_status is not None:
+            query = query.where(model.approval_status == approval_status)
+        return query
 
-    for l in latihan:
-        username = db.query(User).filter(User.user_id == l.author_id).first().username
-        pending_posts.append(
-            schemas.PendingPostData(
-                author_username=username,
-                post_id=l.exercise_id,
-                post_type="Latihan",
-                updated_at=l.updated_at
-            )
-        )
+    return union_all(
+        recent(ReactionArticle, ReactionArticle.article_id, ReactionArticle.description, "Artikel"),
+        recent(Material, Material.material_id, Material.description, "Materi"),
+        recent(Exercise, Exercise.exercise_id, Exercise.difficulty, "Latihan"),
+    ).subquery()
 
-    # Sort the pending_posts by created_at in descending order
-    sorted_pending_posts = sorted(
-        pending_posts, key=lambda x: x.updated_at, reverse=True
-    )
+# Stored as the thumbnail of a video no frame could be read from, so the
+# thumbnail endpoints do not download it again on every request
+NO_THUMBNAIL = ""
 
-    return sorted_pending_posts
+class ThumbnailError(RuntimeError):
+    pass
 
-def get_thumbnail(video_bytes: bytes) -> bytes:
-    with tempfile.NamedTemporaryFile(delete=False) as temp_video:
-        temp_video.write(video_bytes)
-        temp_video_path = temp_video.name
+def thumbnail_filename(filename: str) -> str:
+    return f"{filename.rsplit('.', 1)[0]}_thumb.jpg"
 
+def get_video_thumbnail(video_path: str) -> bytes:
     # Use cv2.VideoCapture to read the video file
-    cap = cv2.VideoCapture(temp_video_path)
+    cap = cv2.VideoCapture(video_path)
     success, frame = cap.read()
     cap.release()
-    os.remove(temp_video_path)
 
     if not success:
-        raise HTTPException(
-            status_code=500, detail="Failed to capture frame from video!"
-        )
+        raise ThumbnailError("Failed to capture frame from video!")
 
     # Convert the frame to a PIL image
     img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
@@ -149,11 +159,73 @@ def get_thumbnail(video_bytes: bytes) -> bytes:
     img_byte_arr.seek(0)
     return img_byte_arr.read()
 
-def compress_video(input_path: str, output_path: str):
+def create_video_thumbnail(video_path: str, filename: str, **account) -> str:
+    thumbnail = thumbnail_filename(filename)
+    upload(thumbnail, get_video_thumbnail(video_path), **account)
+    return thumbnail
+
+def backfill_video_thumbnail(filename: str, **account) -> str:
+    # For videos uploaded before thumbnails were generated at transcode time
+    with tempfile.NamedTemporaryFile(suffix=f".{filename.split('.')[-1]}") as temp_video:
+        for chunk in stream(filename, **account):
+            temp_video.write(chunk)
+        temp_video.flush()
+        try:
+            return create_video_thumbnail(temp_video.name, filename, **account)
+        except ThumbnailError:
+            return NO_THUMBNAIL
+
+def avatar_filename(profile_picture: str, size: int) -> str:
+    return f"{profile_picture.rsplit('.', 1)[0]}_{size}.jpg"
+
+def make_avatar_variants(content: bytes) -> dict:
+    img = Image.open(BytesIO(content))
+    # JPEG draft mode lets the decoder downscale by 1/2, 1/4 or 1/8 while
+    # decoding, so a phone photo is never fully decompressed.
+    largest = max(AVATAR_SIZES)
+    img.draft("RGB", (largest, largest))
+    img = ImageOps.exif_transpose(img).convert("RGB")
+
+    variants = {}
+    for size in AVATAR_SIZES:
+        variant = ImageOps.fit(img, (size, size), Image.LANCZOS)
+        img_byte_arr = BytesIO()
+        variant.save(img_byte_arr, format="JPEG", quality=85, optimize=True)
+        variants[size] = img_byte_arr.getvalue()
+    return variants
+
+async def cached_image_response(
+    filename: str, if_none_match: Optional[str], **account
+) -> Response:
+    etag = f'"{filename}"'
+    headers = {"Cache-Control": f"public, max-age={IMAGE_MAX_AGE}", "ETag": etag}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return StreamingResponse(
+        await run_io(stream, filename, **account), media_type="image/jpeg", headers=headers
+    )
+
+def get_video_duration(input_path: str) -> Optional[float]:
+    import subprocess
+    command = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        input_path,
+    ]
+    try:
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        return float(output.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+def compress_video(input_path: str, output_path: str, on_progress: Optional[Callable[[float], None]] = None):
     import subprocess
     # Save the video using FFmpeg with additional options
     command = [
         "ffmpeg",
+        "-y",
         "-i", input_path,
         "-vcodec", "libx265",
         "-preset", "ultrafast",
@@ -161,10 +233,26 @@ def compress_video(input_path: str, output_path: str):
         "-threads", "4",  # Adjust number of threads based on your CPU capabilities
         "-acodec", "aac",
         "-strict", "experimental",
+        "-progress", "pipe:1",
+        "-nostats",
         output_path
     ]
 
-    subprocess.run(command, check=True)
+    duration = get_video_duration(input_path) if on_progress is not None else None
+
+    # ffmpeg writes key=value progress blocks to stdout, e.g. out_time_us=1500000
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) as process:
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            if on_progress is None:
+                continue
+            if key == "out_time_us" and duration and value.isdigit():
+                on_progress(min(int(value) / 1_000_000 / duration * 100, 99.0))
+            elif key == "progress" and value == "end":
+                on_progress(100.0)
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
 
     return output_path
 
@@ -209,10 +297,120 @@ def send_email(is_approved: bool, name : str = Form(), client_email : str = Form
  
     return "email successfully sent"
 
-def check_video_size_limit(video_path: str) -> bool:
-    file_size = os.path.getsize(video_path)
-    if file_size > VIDEO_MAX_SIZE:
-        os.remove(video_path)
-        return False
+def parse_range_header(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    # Only single byte ranges are honoured; anything else gets the full body
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+
+    start, _, end = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if start == "":
+            first = max(file_size - int(end), 0)
+            last = file_size - 1 if int(end) > 0 else -1
+        else:
+            first = int(start)
+            last = min(int(end), file_size - 1) if end else file_size - 1
+    except ValueError:
+        return None
+
+    if first >= file_size or first > last:
+        raise HTTPException(
+            status_code=416,
+            detail="Range tidak valid!",
+            headers={"Content-Range": f"bytes */{file_size}"},
+        )
+    return first, last
+
+async def ranged_content_response(
+    filename: str, range_header: Optional[str], media_type: Optional[str], **account
+) -> StreamingResponse:
+    try:
+        file_size = await run_io(size, filename, **account)
+    except error_perm:
+        # Server without SIZE support, fall back to a plain full download
+        return StreamingResponse(
+            await run_io(stream, filename, **account), media_type=media_type
+        )
+
+    headers = {"Accept-Ranges": "bytes"}
+    byte_range = parse_range_header(range_header, file_size)
+    if byte_range is None:
+        headers["Content-Length"] = str(file_size)
+        return StreamingResponse(
+            await run_io(stream, filename, **account),
+            media_type=media_type,
+            headers=headers,
+        )
+
+    first, last = byte_range
+    length = last - first + 1
+    headers["Content-Range"] = f"bytes {first}-{last}/{file_size}"
+    headers["Content-Length"] = str(length)
+    if length == file_size:
+        # Players open a video with "bytes=0-"; streamed as a full download
+        # it can fill the content cache.
+        content = await run_io(stream, filename, **account)
     else:
-        return True
\ No newline at end of file
+        content = await run_io(stream, filename, rest=first or None, length=length, **account)
+    return StreamingResponse(
+        content,
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+    )
+
+def _upload_too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Ukuran file melebihi batas maksimum {max_size // (1024 * 1024)} MB!",
+    )
+
+async def read_upload(file: UploadFile, max_size: int = IMAGE_MAX_SIZE) -> bytes:
+    if file.size is not None and file.size > max_size:
+        raise _upload_too_large(max_size)
+
+    buffer = BytesIO()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        if buffer.tell() + len(chunk) > max_size:
+            raise _upload_too_large(max_size)
+        buffer.write(chunk)
+    return buffer.getvalue()
+
+class SavedUpload:
+    # A video upload waiting for its transcode job. Starlette has already
+    # spooled the body to an anonymous temp file; on Linux that file is kept
+    # alive through a duplicated descriptor and opened again by path through
+    # /proc, so the video is not written to disk a second time. Elsewhere it
+    # is copied to a named temp file.
+    def __init__(self, path: str, file=None):
+        self.path = path
+        self._file = file
+
+    def discard(self):
+        if self._file is not None:
+            self._file.close()
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+async def save_upload(file: UploadFile, suffix: str, max_size: int = VIDEO_MAX_SIZE) -> SavedUpload:
+    if file.size is not None and file.size > max_size:
+        raise _upload_too_large(max_size)
+
+    if os.path.isdir("/proc/self/fd"):
+        await run_io(file.file.rollover)
+        kept = os.fdopen(os.dup(file.file.fileno()), "rb")
+        return SavedUpload(f"/proc/{os.getpid()}/fd/{kept.fileno()}", kept)
+
+    total = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as output_file:
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                total += len(chunk)
+                if total > max_size:
+                    raise _upload_too_large(max_size)
+                await run_io(output_file.write, chunk)
+        except BaseException:
+            output_file.close()
+            os.remove(output_file.name)
+            raise
+    return SavedUpload(output_file.name)
@@ -0,0 +1,83 @@
+import os
+import tempfile
+
+# The app reads its settings at import time, so the test database and the
+# other settings are in place before anything from the package is imported.
+_workdir = tempfile.mkdtemp(prefix="virtual-lab-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.pop("DATABASE_REPLICA_URL", None)
+os.environ["FTP_CACHE_DIR"] = os.path.join(_workdir, "cache")
+os.environ["USER_CACHE_TTL"] = "0"
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("JWT_ACCESS_EXPIRE_MINUTES", "60")
+os.environ.setdefault("JWT_REFRESH_EXPIRE_DAYS", "1")
+
+from contextlib import contextmanager
+from typing import Generator, List
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from .. import migrations
+from ..cache import token_versions
+from ..database.database import Base, SessionLocal, engine
+from ..dependencies.dependencies import create_access_token
+from ..main import app
+from ..models import models
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    migrations.upgrade(engine)
+
+
+@pytest.fixture
+def db() -> Generator:
+    session = SessionLocal()
+    yield session
+    session.close()
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    token_versions.clear()
+
+
+@pytest.fixture
+def client() -> TestClient:
+    # Used without a `with` block so the lifespan (FTP keep-alive) never runs
+    return TestClient(app)
+
+
+@contextmanager
+def count_statements(target_engine) -> Generator[List[str], None, None]:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(target_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(target_engine, "before_cursor_execute", record)
+
+
+def add_user(db, username: str, user_type: int) -> models.User:
+    user = models.User(
+        full_name=username,
+        username=username,
+        email=f"{username}@example.com",
+        user_type=user_type,
+        school="SMA",
+        registration_status="APPROVED",
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+def auth_headers(user: models.User) -> dict:
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': user.username})}"}
@@ -0,0 +1,35 @@
+import os
+import time
+
+from ..cache import DiskCache
+
+
+def test_workers_share_one_budget(tmp_path):
+    # Two processes' caches over the same directory
+    first = DiskCache(str(tmp_path), max_bytes=250)
+    second = DiskCache(str(tmp_path), max_bytes=250)
+
+    first.put("teacher", "a.mp4", b"a" * 100)
+    time.sleep(0.01)
+    second.put("teacher", "b.mp4", b"b" * 100)
+    time.sleep(0.01)
+    assert second.get("teacher", "a.mp4") is not None  # a is now the most recent
+    time.sleep(0.01)
+    first.put("teacher", "c.mp4", b"c" * 100)
+
+    assert first.get("teacher", "b.mp4") is None
+    assert second.get("teacher", "b.mp4") is None
+    assert first.get("teacher", "a.mp4") is not None
+    assert second.get("teacher", "c.mp4") is not None
+    assert first.stats()["bytes"] == 200
+
+
+def test_invalidate_is_seen_by_every_worker(tmp_path):
+    first = DiskCache(str(tmp_path), max_bytes=1000)
+    second = DiskCache(str(tmp_path), max_bytes=1000)
+    first.put("user", "x.png", b"x")
+
+    second.invalidate("user", "x.png")
+
+    assert first.get("user", "x.png") is None
+    assert not [name for name in os.listdir(tmp_path) if not name.startswith(".")]
@@ -0,0 +1,104 @@
+import time
+
+from fastapi import HTTPException, Response
+from sqlalchemy import event, update
+
+from ..cache import token_versions, user_cache
+from ..database.database import READ_PRIMARY_COOKIE, SessionLocal, engine, replica_router
+from ..dependencies.dependencies import _resolve_user, create_access_token
+from ..models import models
+from ..schemas import schemas
+from .conftest import add_user, auth_headers, count_statements
+
+credentials_exception = HTTPException(status_code=401, detail="Tidak dapat mengenali akun!")
+
+
+def test_cached_user_stays_out_of_the_session(db, monkeypatch):
+    monkeypatch.setattr(user_cache, "ttl", 60)
+    user = add_user(db, "guru", 1)
+    token_data = schemas.TokenData(username="guru", token_id="token")
+    with SessionLocal() as session:
+        _resolve_user(token_data, session, credentials_exception)
+
+    db.execute(
+        update(models.User).where(models.User.user_id == user.user_id).values(email="baru@example.com")
+    )
+    db.commit()
+
+    with SessionLocal() as session:
+        cached = _resolve_user(token_data, session, credentials_exception)
+        assert cached not in session
+        row = session.query(models.User).filter(models.User.user_id == user.user_id).first()
+        assert row is not cached
+        assert row.email == "baru@example.com"
+    user_cache.invalidate("guru")
+
+
+def claims_headers(user: models.User, version: int) -> dict:
+    token = create_access_token(data={
+        "sub": user.username, "user_id": user.user_id, "user_type": user.user_type, "ver": version,
+    })
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_version_bumped_elsewhere_revokes_claim_tokens(db, client, monkeypatch):
+    monkeypatch.setattr(token_versions, "ttl", 0.05)
+    student = add_user(db, "siswa", 0)
+    headers = claims_headers(student, 0)
+    assert client.get("/v1/exercises/approved", headers=headers).status_code == 404
+
+    # Another worker changes the password: only the row tells this one
+    db.execute(
+        update(models.User).where(models.User.user_id == student.user_id).values(token_version=1)
+    )
+    db.commit()
+    time.sleep(0.1)
+
+    response = client.get("/v1/exercises/approved", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token sudah tidak berlaku!"
+    assert client.get("/v1/exercises/approved", headers=claims_headers(student, 1)).status_code == 404
+
+
+def test_claim_tokens_skip_the_user_query(db, client):
+    student = add_user(db, "siswa", 0)
+    headers = claims_headers(student, 0)
+    client.get("/v1/exercises/approved", headers=headers)
+
+    with count_statements(engine) as statements:
+        client.get("/v1/exercises/approved", headers=headers)
+
+    assert statements == []
+
+
+def test_read_session_is_the_auth_session_without_replica(db, client):
+    teacher = add_user(db, "guru", 1)
+    url, headers = f"/v1/users/{teacher.user_id}/posts", auth_headers(teacher)
+    checkouts = []
+    record = lambda *args: checkouts.append(args)
+    event.listen(engine, "checkout", record)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(engine, "checkout", record)
+
+    assert response.status_code == 200
+    assert len(checkouts) == 1
+
+
+def test_writes_pin_the_client_to_the_primary(db, client, monkeypatch):
+    monkeypatch.setattr(replica_router, "enabled", True)
+    response = Response()
+    with SessionLocal() as session:
+        session.info["response"] = response
+        session.commit()
+    assert f"{READ_PRIMARY_COOKIE}=1" in response.headers["set-cookie"]
+
+    # The cookie keeps the next read on the primary, whichever worker serves it
+    teacher = add_user(db, "guru", 1)
+    client.cookies.set(READ_PRIMARY_COOKIE, "1")
+    before = replica_router.stats()
+    client.get(f"/v1/users/{teacher.user_id}/posts", headers=auth_headers(teacher))
+
+    assert replica_router.stats()["pinned_reads"] == before["pinned_reads"] + 1
+    assert replica_router.stats()["replica_reads"] == before["replica_reads"]
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+from ..database.database import async_engine
+from ..dependencies.pagination import DEFAULT_PAGE_LIMIT
+from ..models import models
+from .conftest import add_user, auth_headers, count_statements
+
+
+def add_exercises(db, author: models.User, count: int) -> list:
+    now = datetime.now()
+    exercises = [
+        models.Exercise(
+            title=f"Latihan {index}",
+            difficulty="Mudah",
+            question_count=1,
+            author_id=author.user_id,
+            approval_status="APPROVED",
+            updated_at=now - timedelta(minutes=index),
+        )
+        for index in range(count)
+    ]
+    db.add_all(exercises)
+    db.commit()
+    return exercises
+
+
+def test_approved_exercises_use_one_query(db, client):
+    teacher = add_user(db, "guru", 1)
+    student = add_user(db, "siswa", 0)
+    exercises = add_exercises(db, teacher, 6)
+    db.add(models.Exercise(
+        title="Draf", difficulty="Sulit", question_count=1, author_id=teacher.user_id, approval_status="PENDING"
+    ))
+    for finished in exercises[1:3]:
+        db.add(models.StudentExerciseResult(
+            student_id=student.user_id, exercise_id=finished.exercise_id, score=100
+        ))
+    db.commit()
+    expected = [exercises[0]] + exercises[3:]
+
+    with count_statements(async_engine.sync_engine) as statements:
+        response = client.get("/v1/exercises/approved", headers=auth_headers(student))
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {"exercise_id": exercise.exercise_id, "title": exercise.title, "difficulty": exercise.difficulty}
+        for exercise in expected
+    ]
+    assert len(statements) == 1
+
+
+def test_approved_exercises_page_with_one_query_each(db, client):
+    teacher = add_user(db, "guru", 1)
+    student = add_user(db, "siswa", 0)
+    exercises = add_exercises(db, teacher, 5)
+    headers = auth_headers(student)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "fields": "exercise_id"}
+        if cursor is not None:
+            params["cursor"] = cursor
+        with count_statements(async_engine.sync_engine) as statements:
+            response = client.get("/v1/exercises/approved", headers=headers, params=params)
+        assert response.status_code == 200
+        assert len(statements) == 1
+        seen += [row["exercise_id"] for row in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert seen == [exercise.exercise_id for exercise in exercises]
+
+
+def test_all_finished_exercises_are_hidden(db, client):
+    teacher = add_user(db, "guru", 1)
+    student = add_user(db, "siswa", 0)
+    for exercise in add_exercises(db, teacher, 2):
+        db.add(models.StudentExerciseResult(
+            student_id=student.user_id, exercise_id=exercise.exercise_id, score=50
+        ))
+    db.commit()
+
+    with count_statements(async_engine.sync_engine) as statements:
+        response = client.get("/v1/exercises/approved", headers=auth_headers(student))
+
+    # The listing plus the check that tells "all done" apart from "none yet"
+    assert response.status_code == 200
+    assert response.json() == []
+    assert len(statements) == 2
+
+
+def test_approved_exercises_are_paged_by_default(db, client):
+    teacher = add_user(db, "guru", 1)
+    student = add_user(db, "siswa", 0)
+    add_exercises(db, teacher, DEFAULT_PAGE_LIMIT + 5)
+
+    response = client.get("/v1/exercises/approved", headers=auth_headers(student))
+
+    assert response.status_code == 200
+    assert len(response.json()) == DEFAULT_PAGE_LIMIT
+    assert "X-Next-Cursor" in response.headers
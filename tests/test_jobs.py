@@ -0,0 +1,31 @@
+from ..models import models
+from .conftest import add_user, auth_headers
+
+
+def add_job(db, owner: models.User) -> models.TranscodeJob:
+    job = models.TranscodeJob(
+        job_id="a" * 32, kind="material", target_id=1, owner_id=owner.user_id, status="PROCESSING", progress=42.0
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+def test_job_status_is_read_from_the_table(db, client):
+    # Written by whichever worker runs the job, not the one being polled
+    teacher = add_user(db, "guru", 1)
+    job = add_job(db, teacher)
+
+    response = client.get(f"/v1/jobs/{job.job_id}", headers=auth_headers(teacher))
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "PROCESSING"
+    assert response.json()["progress"] == 42.0
+
+
+def test_job_status_is_private(db, client):
+    job = add_job(db, add_user(db, "guru", 1))
+    other = add_user(db, "lain", 1)
+
+    assert client.get(f"/v1/jobs/{job.job_id}", headers=auth_headers(other)).status_code == 403
+    assert client.get(f"/v1/jobs/{'b' * 32}", headers=auth_headers(other)).status_code == 404
@@ -0,0 +1,91 @@
+import re
+
+import pytest
+from sqlalchemy import inspect, select
+
+from ..database.database import Base, engine
+from ..models.models import (
+    Material,
+    Exercise,
+    ReactionArticle,
+    Question,
+    StudentAnswer,
+    StudentExerciseResult,
+)
+from ..migrations import v0001_baseline
+
+# The hot queries with the index each of them has to use. The plans are
+# read with SQLite's EXPLAIN QUERY PLAN, which names the index it searches.
+HOT_QUERIES = [
+    (
+        select(Material.material_id)
+        .where(Material.approval_status == "APPROVED")
+        .order_by(Material.updated_at.desc(), Material.material_id.desc()),
+        "ix_materials_status_updated",
+    ),
+    (
+        select(Exercise.exercise_id)
+        .where(Exercise.approval_status == "APPROVED")
+        .order_by(Exercise.updated_at.desc(), Exercise.exercise_id.desc()),
+        "ix_exercises_status_updated",
+    ),
+    (
+        select(ReactionArticle.article_id)
+        .where(ReactionArticle.approval_status == "APPROVED")
+        .order_by(ReactionArticle.updated_at.desc(), ReactionArticle.article_id.desc()),
+        "ix_articles_status_updated",
+    ),
+    (
+        select(Material.material_id)
+        .where(Material.author_id == 1)
+        .order_by(Material.updated_at.desc(), Material.material_id.desc()),
+        "ix_materials_author_updated",
+    ),
+    (
+        select(Exercise.exercise_id)
+        .where(Exercise.author_id == 1)
+        .order_by(Exercise.updated_at.desc(), Exercise.exercise_id.desc()),
+        "ix_exercises_author_updated",
+    ),
+    (
+        select(ReactionArticle.article_id)
+        .where(ReactionArticle.author_id == 1)
+        .order_by(ReactionArticle.updated_at.desc(), ReactionArticle.article_id.desc()),
+        "ix_articles_author_updated",
+    ),
+    (
+        select(Question.question_id).where(Question.exercise_id == 1),
+        "ix_questions_exercise",
+    ),
+    (
+        select(StudentAnswer.answer_id).where(StudentAnswer.result_id == 1),
+        "ix_student_answers_result",
+    ),
+    (
+        select(StudentExerciseResult.result_id).where(
+            StudentExerciseResult.student_id == 1, StudentExerciseResult.exercise_id == 1
+        ),
+        "uq_student_exercise",
+    ),
+]
+
+
+@pytest.mark.parametrize("statement, index", HOT_QUERIES, ids=[index for _, index in HOT_QUERIES])
+def test_hot_query_uses_index(statement, index):
+    sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        plan = " ".join(row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+    assert re.search(rf"USING (COVERING )?INDEX {index}\b", plan), plan
+
+
+def test_migrations_build_the_models_schema():
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        assert {column["name"] for column in inspector.get_columns(table.name)} == set(table.columns.keys())
+
+
+def test_baseline_is_frozen():
+    # New columns belong in a new migration, never in the baseline
+    assert "media_status" not in v0001_baseline.metadata.tables["Materials"].c
+    assert "token_version" not in v0001_baseline.metadata.tables["Users"].c
+    assert not any(table.indexes for table in v0001_baseline.metadata.tables.values())
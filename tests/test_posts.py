@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from ..models import models
+from ..schemas.utils import encode_cursor
+from .conftest import add_user, auth_headers
+
+
+def add_posts(db, author: models.User) -> None:
+    # Same timestamp everywhere, so only the type and the id order the rows
+    now = datetime(2024, 1, 1, 12, 0)
+    for index in range(2):
+        db.add(models.Material(
+            title=f"Materi {index}", media_type="image", filename="m.png",
+            author_id=author.user_id, updated_at=now,
+        ))
+        db.add(models.Exercise(
+            title=f"Latihan {index}", difficulty="Mudah", question_count=1,
+            author_id=author.user_id, updated_at=now,
+        ))
+        db.add(models.ReactionArticle(
+            title=f"Artikel {index}", filename="a.pdf", description="-",
+            author_id=author.user_id, updated_at=now,
+        ))
+    db.commit()
+
+
+def test_recent_posts_page_across_tables(db, client):
+    teacher = add_user(db, "guru", 1)
+    add_posts(db, teacher)
+    headers = auth_headers(teacher)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 4}
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = client.get(f"/v1/users/{teacher.user_id}/posts", headers=headers, params=params)
+        assert response.status_code == 200
+        seen += [(post["post_type"], post["post_id"]) for post in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert len(seen) == 6
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_recent_posts_reject_a_list_cursor(db, client):
+    teacher = add_user(db, "guru", 1)
+    add_posts(db, teacher)
+
+    # A cursor from a single-table list does not fit the posts' three columns
+    cursor = encode_cursor(datetime(2024, 1, 1), 1)
+    response = client.get(
+        f"/v1/users/{teacher.user_id}/posts", headers=auth_headers(teacher), params={"cursor": cursor}
+    )
+
+    assert response.status_code == 400
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from ..schemas import utils
+
+CONTENT = bytes(range(100))
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=10-19", (10, 19)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=40-", (40, 99)),
+    ("bytes=90-500", (90, 99)),
+])
+def test_single_ranges(header, expected):
+    assert utils.parse_range_header(header, len(CONTENT)) == expected
+
+
+@pytest.mark.parametrize("header", [None, "", "items=0-9", "bytes=0-9,20-29", "bytes=a-b"])
+def test_other_headers_get_the_full_body(header):
+    assert utils.parse_range_header(header, len(CONTENT)) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=20-10", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(HTTPException) as error:
+        utils.parse_range_header(header, len(CONTENT))
+
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == "bytes */100"
+
+
+def fake_stream(filename, rest=None, length=None, **account):
+    start = rest or 0
+    end = len(CONTENT) if length is None else start + length
+    yield CONTENT[start:end]
+
+
+async def read_body(response) -> bytes:
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+def test_partial_content_response(monkeypatch):
+    monkeypatch.setattr(utils, "size", lambda filename, **account: len(CONTENT))
+    monkeypatch.setattr(utils, "stream", fake_stream)
+
+    response = asyncio.run(utils.ranged_content_response("video.mp4", "bytes=-10", "video/mp4"))
+
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == "bytes 90-99/100"
+    assert response.headers["Content-Length"] == "10"
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert asyncio.run(read_body(response)) == CONTENT[90:]